@@ -0,0 +1,210 @@
+"""
+address_parser.py
+-----------------
+Deterministic fast-path parser for Israeli addresses (Hebrew or English).
+
+parse_address_local(text) → ({'street', 'number', 'city', 'country'}, confidence)
+normalize_text(text)      → cache key form of a free-text address
+canonical_city(name)      → gazetteer's canonical name for a city alias, or None
+
+Handles the common shapes without an LLM round-trip:
+    "תל חי 30 באר שבע"          "רחוב הרצל 12א, תל אביב-יפו"
+    "30 Tel Hai St, Beer Sheva"  "Herzl 5 Haifa Israel"
+
+The city is found by longest match against a gazetteer (CITIES below plus
+an optional JSON file at $CITY_GAZETTEER: a list of names or a
+{canonical: [aliases…]} map); the house number is the one token that looks
+like `12` / `12א` / `12b`; whatever is left is the street.  Confidence is
+1.0 only when all three are found unambiguously — callers should fall back
+to the LLM below PARSE_MIN_CONFIDENCE.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from functools import lru_cache
+
+PARSE_MIN_CONFIDENCE = float(os.getenv("PARSE_MIN_CONFIDENCE", "0.9"))
+
+# canonical Hebrew name → spelling variants seen in user input
+CITIES: dict[str, list[str]] = {
+    "ירושלים":        ["Jerusalem"],
+    "תל אביב-יפו":    ["תל אביב", "תל-אביב", "תל אביב יפו", "ת\"א", "Tel Aviv", "Tel Aviv-Yafo", "Tel-Aviv"],
+    "חיפה":           ["Haifa"],
+    "ראשון לציון":    ["ראשל\"צ", "Rishon LeZion", "Rishon Lezion", "Rishon LeTsiyon"],
+    "פתח תקווה":      ["פתח תקוה", "פ\"ת", "Petah Tikva", "Petach Tikva", "Petah Tiqva"],
+    "אשדוד":          ["Ashdod"],
+    "נתניה":          ["Netanya"],
+    "באר שבע":        ["ב\"ש", "Beer Sheva", "Be'er Sheva", "Beersheba", "Beer-Sheva", "Beersheva"],
+    "בני ברק":        ["Bnei Brak", "Bene Beraq"],
+    "חולון":          ["Holon"],
+    "רמת גן":         ["Ramat Gan"],
+    "אשקלון":         ["Ashkelon"],
+    "רחובות":         ["Rehovot"],
+    "בת ים":          ["Bat Yam"],
+    "בית שמש":        ["Beit Shemesh", "Bet Shemesh"],
+    "כפר סבא":        ["Kfar Saba", "Kfar Sava"],
+    "הרצליה":         ["Herzliya", "Herzliyya"],
+    "חדרה":           ["Hadera"],
+    "מודיעין-מכבים-רעות": ["מודיעין", "Modiin", "Modi'in"],
+    "נצרת":           ["Nazareth"],
+    "לוד":            ["Lod"],
+    "רמלה":           ["Ramla"],
+    "רעננה":          ["Raanana", "Ra'anana"],
+    "ראש העין":       ["Rosh HaAyin", "Rosh Haayin"],
+    "הוד השרון":      ["Hod HaSharon", "Hod Hasharon"],
+    "גבעתיים":        ["Givatayim"],
+    "קריית אתא":      ["קרית אתא", "Kiryat Ata"],
+    "קריית גת":       ["קרית גת", "Kiryat Gat"],
+    "קריית ביאליק":   ["קרית ביאליק", "Kiryat Bialik"],
+    "קריית מוצקין":   ["קרית מוצקין", "Kiryat Motzkin"],
+    "קריית ים":       ["קרית ים", "Kiryat Yam"],
+    "קריית שמונה":    ["קרית שמונה", "Kiryat Shmona"],
+    "נהריה":          ["Nahariya"],
+    "עכו":            ["Akko", "Acre"],
+    "עפולה":          ["Afula"],
+    "טבריה":          ["Tiberias"],
+    "צפת":            ["Safed", "Tzfat"],
+    "אילת":           ["Eilat"],
+    "דימונה":         ["Dimona"],
+    "ערד":            ["Arad"],
+    "אופקים":         ["Ofakim"],
+    "נתיבות":         ["Netivot"],
+    "שדרות":          ["Sderot"],
+    "יבנה":           ["Yavne", "Yavneh"],
+    "נס ציונה":       ["Ness Ziona", "Nes Ziona"],
+    "אור יהודה":      ["Or Yehuda"],
+    "יהוד-מונוסון":   ["יהוד", "Yehud"],
+    "רמת השרון":      ["Ramat HaSharon", "Ramat Hasharon"],
+    "כרמיאל":         ["Karmiel"],
+    "מעלות-תרשיחא":   ["מעלות", "Maalot"],
+    "בית שאן":        ["Beit Shean", "Beit She'an"],
+    "יקנעם עילית":    ["יקנעם", "Yokneam"],
+    "נוף הגליל":      ["Nof HaGalil"],
+    "טירת כרמל":      ["Tirat Carmel"],
+    "אור עקיבא":      ["Or Akiva"],
+    "זכרון יעקב":     ["Zikhron Ya'akov", "Zichron Yaakov"],
+    "מבשרת ציון":     ["Mevaseret Zion"],
+    "אריאל":          ["Ariel"],
+    "מעלה אדומים":    ["Ma'ale Adumim", "Maale Adumim"],
+    "ביתר עילית":     ["Beitar Illit"],
+    "מודיעין עילית":  ["Modiin Illit"],
+    "אלעד":           ["Elad"],
+    "קריית אונו":     ["קרית אונו", "Kiryat Ono"],
+    "גבעת שמואל":     ["Givat Shmuel"],
+    "רהט":            ["Rahat"],
+    "אום אל-פחם":     ["Umm al-Fahm"],
+    "טייבה":          ["Tayibe"],
+    "שפרעם":          ["Shefar'am", "Shfaram"],
+}
+
+COUNTRY_WORDS = {"ישראל", "israel", "il"}
+STREET_WORDS = {"רחוב", "רח'", "רח", "street", "st", "st.", "str"}
+# street-type prefixes kept in the street name; "שדרות" is also a city
+STREET_TYPES = {"שדרות", "שד'", "דרך", "boulevard", "blvd", "blvd."}
+_HE_PREFIXES = {"רחוב", "רח'", "רח", "שדרות", "שד'", "דרך"}
+NUMBER_RE = re.compile(r"^\d{1,4}[א-תa-zA-Z]?$")
+_PUNCT_RE = re.compile(r"[,;/]+")
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-, punctuation-, case- and final-letter-insensitive form of `text`."""
+    text = _NON_WORD_RE.sub(" ", text.replace("_", " ")).translate(_FINALS)
+    return " ".join(text.split()).casefold()
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.replace("־", "-").split()).casefold()
+
+
+@lru_cache(maxsize=1)
+def _gazetteer() -> dict[tuple[str, ...], str]:
+    """alias token tuple → canonical city name (built once)."""
+    cities = {k: list(v) for k, v in CITIES.items()}
+    extra = os.getenv("CITY_GAZETTEER")
+    if extra and os.path.exists(extra):
+        with open(extra, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {name: [] for name in data}
+        for name, aliases in data.items():
+            cities.setdefault(name, []).extend(aliases)
+    table = {}
+    for canon, aliases in cities.items():
+        for alias in (canon, *aliases):
+            for variant in {_norm(alias), _norm(alias.replace("-", " "))}:
+                table[tuple(variant.split())] = canon
+    return table
+
+
+def canonical_city(name: str) -> str | None:
+    """Canonical Hebrew name for a known city spelling ("Beer Sheva" → "באר שבע")."""
+    return _gazetteer().get(tuple(_norm(name).split()))
+
+
+def _find_city(tokens: list[str]) -> tuple[int, int, str] | None:
+    """Longest gazetteer match; ties go to one that ends, then starts, the text."""
+    table = _gazetteer()
+    longest = max(map(len, table))
+    best = None
+    for n in range(min(longest, len(tokens)), 0, -1):
+        for i in range(len(tokens) - n + 1):
+            canon = table.get(tuple(tokens[i:i + n]))
+            if canon is None:
+                continue
+            if i == 0 and tokens[0] in STREET_TYPES and n < len(tokens):
+                continue                # "שדרות רוטשילד 10": a boulevard, not Sderot
+            if i > 0 and tokens[i - 1] in _HE_PREFIXES:
+                continue                # "שדרות ירושלים": a street named after a city
+            edge = 2 if i + n == len(tokens) else 1 if i == 0 else 0
+            if best is None or edge > best[1]:
+                best = (i, edge, canon)
+        if best:
+            break
+    if best is None:
+        return None
+    i, _, canon = best
+    return i, i + n, canon
+
+
+def parse_address_local(text: str) -> tuple[dict | None, float]:
+    """Parse `text` without an LLM; returns (parts or None, confidence 0…1)."""
+    raw = _PUNCT_RE.sub(" , ", text).split()
+    tokens = [_norm(t) for t in raw]
+
+    # drop a trailing country name
+    while tokens and tokens[-1] in COUNTRY_WORDS | {","}:
+        tokens.pop(); raw.pop()
+
+    hit = _find_city(tokens)
+    if hit is None:
+        return None, 0.0
+    c0, c1, canon = hit
+    city = " ".join(raw[c0:c1])
+    if '"' in city:
+        city = canon                # ת"א / ב"ש → a name the geocoders know
+    rest = [(r, t) for k, (r, t) in enumerate(zip(raw, tokens))
+            if not c0 <= k < c1 and t != "," and t not in COUNTRY_WORDS]
+
+    numbers = [r for r, t in rest if NUMBER_RE.match(t)]
+    street = " ".join(r for r, t in rest if not NUMBER_RE.match(t) and t not in STREET_WORDS)
+
+    confidence = 1.0
+    if len(numbers) != 1:
+        confidence -= 0.4           # no house number, or an ambiguous one
+    if not street or any(ch.isdigit() for ch in street):
+        confidence -= 0.5
+    if c0 not in (0, len(tokens) - (c1 - c0)) and "," not in tokens:
+        confidence -= 0.2           # city buried mid-string: odd layout
+    elif c0 == 0 and c1 < len(tokens) and tokens[c1] != ",":
+        confidence -= 0.2           # leading city with no comma: may be a street name
+
+    number = numbers[0] if numbers else None
+    if number and number.isdigit():
+        number = int(number)
+    parts = {"street": street, "number": number, "city": city, "country": "Israel"}
+    return parts, round(max(confidence, 0.0), 2)
@@ -0,0 +1,59 @@
+"""
+aio_loop.py
+-----------
+One long-lived asyncio event loop on a daemon thread, shared by sync code.
+
+The AutoGen tools are plain sync functions, but pooled async clients
+(httpx connection pools, MCP sessions, …) are bound to the loop that created
+them.  Running every coroutine on this one background loop lets those pools
+live for the whole process instead of dying with each `asyncio.run`.
+
+    from aio_loop import run
+    result = run(some_coroutine(), timeout=30)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine
+
+_loop: asyncio.AbstractEventLoop | None = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the background loop, starting its thread on first use."""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="aio-loop", daemon=True
+                ).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro: Coroutine) -> concurrent.futures.Future:
+    """Schedule `coro` on the background loop; returns a thread-safe future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro: Coroutine, timeout: float | None = None) -> Any:
+    """Run `coro` on the background loop and block until it finishes."""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None and running is _loop:
+        coro.close()                    # would deadlock: we are that loop
+        raise RuntimeError("aio_loop.run() called from the background loop itself")
+    fut = submit(coro)
+    try:
+        return fut.result(timeout)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()
+        raise
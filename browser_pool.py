@@ -0,0 +1,163 @@
+"""
+browser_pool.py
+---------------
+Long-lived pool of pre-warmed headless Chromium browsers for the scrapers.
+
+    pool = BrowserPool(size=2, max_uses=50, max_concurrency=4)
+    await pool.start()                       # from the server lifespan
+    async with pool.context() as ctx:        # isolated BrowserContext per call
+        page = await ctx.new_page()
+        ...
+    await pool.stop()
+
+• `size` browsers are launched up front, so a call only pays for
+  `new_context()` (milliseconds) instead of a Chromium cold start.
+• Each call gets its own context (cookies, cache, downloads isolated) on the
+  least-busy browser; at most `max_concurrency` contexts are open at once.
+• Health check: a browser that disconnected is replaced on the next call.
+• Recycling: after `max_uses` contexts a browser stops taking new work and is
+  closed once its last context finishes; a fresh one takes its place.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+log = logging.getLogger(__name__)
+
+POOL_SIZE       = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+POOL_MAX_USES   = int(os.getenv("BROWSER_MAX_USES", "50"))
+POOL_MAX_ACTIVE = int(os.getenv("BROWSER_MAX_CONCURRENCY", "4"))
+
+
+class _Slot:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.retiring = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser.is_connected()
+
+
+class BrowserPool:
+    """N warm Chromium browsers handing out isolated contexts."""
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = POOL_MAX_USES,
+                 max_concurrency: int = POOL_MAX_ACTIVE, **launch_kwargs):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_concurrency = max_concurrency
+        self.launch_kwargs = {"headless": True, **launch_kwargs}
+        self._pw: Playwright | None = None
+        self._slots: list[_Slot] = []
+        self._lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    # ── lifecycle ────────────────────────────────────────────────────────────
+    async def start(self) -> "BrowserPool":
+        async with self._start_lock:
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+                self._slots = list(await asyncio.gather(
+                    *(self._launch() for _ in range(self.size))))
+                log.info("browser pool started: %d browser(s)", self.size)
+        return self
+
+    async def stop(self) -> None:
+        if self._pw is None:
+            return
+        await asyncio.gather(*(s.browser.close() for s in self._slots),
+                             return_exceptions=True)
+        self._slots = []
+        await self._pw.stop()
+        self._pw = None
+
+    async def _launch(self) -> _Slot:
+        return _Slot(await self._pw.chromium.launch(**self.launch_kwargs))
+
+    # ── checkout ─────────────────────────────────────────────────────────────
+    def _live(self) -> list[_Slot]:
+        return [s for s in self._slots if not s.retiring and s.healthy]
+
+    def _refill_soon(self) -> None:
+        task = asyncio.create_task(self._refill())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self) -> None:
+        """Launch browsers until `size` healthy, non-retiring ones are available."""
+        async with self._lock:
+            missing = self.size - len(self._live())
+            if missing > 0:
+                self._slots.extend(await asyncio.gather(
+                    *(self._launch() for _ in range(missing))))
+
+    async def _acquire(self) -> _Slot:
+        # health check: drop browsers that crashed / disconnected
+        for slot in [s for s in self._slots if not s.healthy]:
+            log.warning("browser pool: dropping disconnected browser")
+            self._slots.remove(slot)
+
+        live = self._live()
+        if not live:
+            await self._refill()
+            live = self._live()
+        elif len(live) < self.size:
+            self._refill_soon()                   # top up in the background
+
+        slot = min(live, key=lambda s: s.active)
+        slot.uses += 1
+        slot.active += 1
+        if slot.uses >= self.max_uses:
+            slot.retiring = True
+            self._refill_soon()                   # replacement warms up now
+        return slot
+
+    async def _release(self, slot: _Slot) -> None:
+        slot.active -= 1
+        if slot.retiring and slot.active == 0:
+            if slot in self._slots:
+                self._slots.remove(slot)
+            try:
+                await slot.browser.close()
+            except Exception:                 # already gone – nothing to clean up
+                pass
+
+    @asynccontextmanager
+    async def context(self, **context_kwargs) -> AsyncIterator[BrowserContext]:
+        """An isolated BrowserContext on a warm browser; closed on exit."""
+        if self._pw is None:
+            await self.start()
+        async with self._sem:
+            slot = await self._acquire()
+            try:
+                ctx = await slot.browser.new_context(
+                    **{"accept_downloads": True, **context_kwargs})
+                try:
+                    yield ctx
+                finally:
+                    try:
+                        await ctx.close()
+                    except Exception:         # browser died mid-call
+                        pass
+            finally:
+                await self._release(slot)
+
+    def stats(self) -> dict:
+        return {
+            "browsers":  len(self._slots),
+            "active":    sum(s.active for s in self._slots),
+            "uses":      [s.uses for s in self._slots],
+            "retiring":  sum(s.retiring for s in self._slots),
+        }
@@ -0,0 +1,151 @@
+"""
+circuit_breaker.py
+------------------
+Circuit breaker + latency-percentile timeouts for a flaky upstream (MaVaT).
+
+    breaker = CircuitBreaker("mavat")
+    breaker.check()                                  # raises CircuitOpen when open
+    timeout = breaker.timeout_ms("goto", 30_000)     # adaptive, capped at 30 s
+    ...
+    breaker.success({"goto": 0.8, "render": 1.9})    # per-step seconds
+    breaker.failure(exc)
+    breaker.metrics()                                # state, failures, p50/p95 …
+
+• closed → open after `failure_threshold` consecutive failures; while open
+  every call fails immediately (CircuitOpen) instead of burning the full
+  navigation/click/download timeouts.
+• open → half-open after `reset_timeout` s: one trial call is let through;
+  its success closes the breaker, its failure re-opens it.
+• Timeouts: once a step has `min_samples` successful latencies, its timeout
+  is `factor` × its p95 (never below `floor_ms`, never above the static
+  default), so a healthy MaVaT gets tight deadlines and a hung one is
+  detected in seconds.
+
+State is per process; each worker protects its own threads.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """The upstream is considered down; retry after `retry_after` seconds."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with per-step latency tracking."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 window: int = 200, min_samples: int = 20, factor: float = 3.0,
+                 floor_ms: float = 2_000):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_samples = min_samples
+        self.factor = factor
+        self.floor_ms = floor_ms
+        self._window = window
+        self._lat: dict[str, deque] = {}
+        self._mu = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0               # consecutive
+        self.opened_at = 0.0
+        self._trial = False
+        self.totals = {"success": 0, "failure": 0, "rejected": 0, "opened": 0}
+        self.last_error: str | None = None
+
+    # ── gate ─────────────────────────────────────────────────────────────────
+    def check(self) -> None:
+        """Let the call through, or raise CircuitOpen."""
+        with self._mu:
+            if self.state == CLOSED:
+                return
+            wait = self.opened_at + self.reset_timeout - time.time()
+            if self.state == OPEN and wait <= 0:
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True          # exactly one probe at a time
+                return
+            self.totals["rejected"] += 1
+            raise CircuitOpen(self.name, max(wait, 1.0))
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected (open, or half-open with a probe out)."""
+        with self._mu:
+            if self.state == OPEN:
+                return time.time() < self.opened_at + self.reset_timeout
+            return self.state == HALF_OPEN and self._trial
+
+    # ── outcomes ─────────────────────────────────────────────────────────────
+    def success(self, steps: dict[str, float] | None = None) -> None:
+        with self._mu:
+            self.totals["success"] += 1
+            self.failures = 0
+            self.state = CLOSED
+            self._trial = False
+            for step, seconds in (steps or {}).items():
+                self._lat.setdefault(step, deque(maxlen=self._window)).append(seconds)
+
+    def failure(self, exc: BaseException | None = None) -> None:
+        with self._mu:
+            self.totals["failure"] += 1
+            self.failures += 1
+            if exc is not None:
+                self.last_error = f"{type(exc).__name__}: {exc}"[:300]
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.totals["opened"] += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+                self._trial = False
+
+    def abandon(self) -> None:
+        """The call was cancelled without an outcome: free the half-open probe."""
+        with self._mu:
+            self._trial = False
+
+    # ── adaptive timeouts ────────────────────────────────────────────────────
+    def timeout_ms(self, step: str, default_ms: float) -> float:
+        """Deadline for `step`: factor × p95 of recent successes, within [floor, default]."""
+        with self._mu:
+            samples = self._lat.get(step)
+            if not samples or len(samples) < self.min_samples:
+                return default_ms
+            p95 = float(np.percentile(samples, 95)) * 1000
+        return min(default_ms, max(self.floor_ms, self.factor * p95))
+
+    def metrics(self) -> dict:
+        with self._mu:
+            steps = {
+                step: {
+                    "samples": len(s),
+                    "p50_ms": round(float(np.percentile(s, 50)) * 1000, 1),
+                    "p95_ms": round(float(np.percentile(s, 95)) * 1000, 1),
+                }
+                for step, s in self._lat.items() if s
+            }
+            state = self.state
+            if state == OPEN and time.time() >= self.opened_at + self.reset_timeout:
+                state = HALF_OPEN               # next call will probe
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self.failures,
+                "opened_at": self.opened_at or None,
+                "last_error": self.last_error,
+                **self.totals,
+                "steps": steps,
+            }
@@ -2,8 +2,19 @@
 extract_table5.py  –  resilient version
 ---------------------------------------
 • Works even if the table is an embedded image (vision fallback)
-• Maps fuzzy / variant Hebrew headers to *canonical* 9 keys
+• Maps fuzzy / variant Hebrew headers to *canonical* 9 keys – locally
+  (header_map.py) for most tables; GPT-4o only maps the headers the local
+  engine is unsure about, or converts tables it can't read at all
 • Missing values come back as null (not an empty list)
+• Table-5 page is located in two tiers: a cheap pypdfium2 text scan scores
+  every page, full pdfplumber layout analysis runs only on the best few;
+  when tier 1 is unsure the remaining pages are scanned in parallel chunks
+  on one shared forkserver process pool (TABLE5_WORKERS), stopping as soon
+  as a match is found
+• What was derived from a PDF (page number, raw table grid, TSV) is cached
+  per PDF SHA-256, so re-running the LLM step never re-parses the PDF
+• GPT-4o replies (TSV→JSON, vision, header mapping) are cached by deployment
+  + prompt-constants hash + content hash; editing a prompt invalidates them
 
 Canonical keys returned (order is whatever the PDF uses):
     שם התכנית ייעוד תא שטח
@@ -17,14 +28,23 @@ Canonical keys returned (order is whatever the PDF uses):
     רחק
 """
 from __future__ import annotations
-import base64, json, re, warnings
+import base64, hashlib, json, multiprocessing, os, re, threading, warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from typing import List
 
 import pdfplumber
+try:
+    import pypdfium2 as pdfium          # ships with pdfplumber >= 0.11
+except ImportError:
+    pdfium = None
 from PIL import Image
 from openai import AzureOpenAI
 
+from header_map import HeaderMapper
+from kvcache import MISS, SqliteCache, key_for
+
 # ── 1. Azure creds ────────────────────────────────────────────────────────────
 AZURE_OAI_ENDPOINT = "https://ai-tomgurevich0575ai135301545538.openai.azure.com"
 AZURE_OAI_KEY      = "EM7HLeBTOHSNHTTPG1mYWUyHyJNZuyXM3VIW01taczzBp4ottOioJQQJ99BEACHYHv6XJ3w3AAAAACOGQ0fz"
@@ -37,19 +57,202 @@ client = AzureOpenAI(
     azure_endpoint = AZURE_OAI_ENDPOINT,
 )
 
+# LRU-bounded persistent cache of chat replies (see cached_chat)
+_llm_cache = SqliteCache("llm_responses",
+                         max_entries=int(os.getenv("LLM_CACHE_MAX", "20000")))
+
+
+def cached_chat(prompt: tuple[str, ...], content: str | bytes, messages: list,
+                parse=lambda reply: reply, **params):
+    """
+    `parse(reply)` of a chat completion, cached under (deployment, hash of the
+    prompt constants + call params, hash of the content).  Changing a prompt
+    constant changes the key, so stale replies are never served and simply
+    age out of the LRU.  Replies that `parse` rejects are not cached.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    key = key_for({
+        "deployment": DEPLOYMENT_NAME,
+        "prompt": hashlib.sha256(json.dumps([prompt, params], ensure_ascii=False,
+                                            sort_keys=True).encode("utf-8")).hexdigest(),
+        "content": hashlib.sha256(content).hexdigest(),
+    })
+    hit = _llm_cache.get(key)
+    if hit is not MISS:
+        return parse(hit)
+    resp = client.chat.completions.create(model=DEPLOYMENT_NAME, messages=messages, **params)
+    reply = resp.choices[0].message.content.strip()
+    result = parse(reply)
+    _llm_cache.set(key, reply)
+    return result
+
 # ── 2. PDF helpers ────────────────────────────────────────────────────────────
 warnings.filterwarnings("ignore", message="CropBox missing")
 
 REV_KEYWORDS = ("תלבט", "הינב", "יזוחא")   # טבלת / בניה / אחוזי (backwards)
 REV_MOZEA    = ("עצומ", "בצמ")             # מוצע backwards
 
-def find_table5_page(pdf_path: Path) -> pdfplumber.page.Page:
+FWD_KEYWORDS = tuple(k[::-1] for k in REV_KEYWORDS)
+FWD_MOZEA    = tuple(m[::-1] for m in REV_MOZEA)
+SECTION5     = ("5.טבלת", "תלבט.5")                # "5. טבלת זכויות…" heading
+TIER2_CANDIDATES   = 2                           # pages laid out before fanning out
+TABLE5_WORKERS     = int(os.getenv("TABLE5_WORKERS", str(min(8, os.cpu_count() or 1))))
+PARALLEL_MIN_PAGES = int(os.getenv("TABLE5_PARALLEL_MIN_PAGES", "24"))
+
+
+def _is_table5(txt: str) -> bool:
+    """The original (pdfplumber-text) test for the Table-5 page."""
+    return all(k in txt for k in REV_KEYWORDS) and any(m in txt for m in REV_MOZEA)
+
+
+def _page_texts(pdf_path: Path) -> list[str] | None:
+    """Raw text of every page, no layout analysis (None without pypdfium2)."""
+    if pdfium is None:
+        return None
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        texts = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def score_pages(texts: list[str]) -> list[float]:
+    """
+    Tier-1 score per page: keyword hits (either text direction) dominate;
+    ties go to pages in the middle third and after the section-5 heading.
+    """
+    n = len(texts)
+    section5 = next((i for i, t in enumerate(texts)
+                     if any(s in "".join(t.split()) for s in SECTION5)), None)
+    scores = []
+    for i, t in enumerate(texts):
+        txt = "".join(t.split())
+        hits = sum(r in txt or f in txt for r, f in zip(REV_KEYWORDS, FWD_KEYWORDS))
+        hits += any(m in txt for m in REV_MOZEA + FWD_MOZEA)
+        score = 2.0 * hits
+        if n >= 3 and n / 3 <= i < 2 * n / 3:
+            score += 0.5
+        if section5 is not None and i >= section5:
+            score += 0.5
+        scores.append(score)
+    return scores
+
+
+# One process pool for the whole process, shared by concurrent scans.  Each
+# scan leases a slot of the shared `_best` array ("earliest match so far").
+# forkserver/spawn, never fork: the API process already runs threads
+# (aio_loop, request executors), and forking those can deadlock the child.
+SCAN_SLOTS = 64
+_best = None            # worker side: the shared slot array (see _init_scan)
+_pool: ProcessPoolExecutor | None = None
+_pool_best = None
+_free_slots = list(range(SCAN_SLOTS))
+_pool_lock = threading.Lock()
+
+
+def _init_scan(best) -> None:
+    global _best
+    _best = best
+
+
+def _scan_range(pdf_path: str, pages: list[int], slot: int = -1) -> int | None:
+    """First Table-5 page in `pages` (ascending), checked with full pdfplumber."""
+    best = _best if slot >= 0 else None
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in pages:
+            if best is not None and best[slot] <= i:
+                return None                 # another worker found an earlier page
+            page = pdf.pages[i]
+            txt = (page.extract_text() or "").replace(" ", "")
+            page.flush_cache()
+            if _is_table5(txt):
+                if best is not None:
+                    with best.get_lock():
+                        best[slot] = min(best[slot], i)
+                return i
+    return None
+
+
+def _scan_pool() -> tuple[ProcessPoolExecutor, object]:
+    global _pool, _pool_best
+    if _pool is None:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pool_best = ctx.Array("i", SCAN_SLOTS)
+        _pool = ProcessPoolExecutor(TABLE5_WORKERS, mp_context=ctx,
+                                    initializer=_init_scan, initargs=(_pool_best,))
+    return _pool, _pool_best
+
+
+def _scan_pages(pdf_path: Path, pages: list[int]) -> int | None:
+    """
+    Earliest Table-5 page among `pages`.  Large ranges are split into
+    contiguous chunks scanned by the shared process pool; each worker opens
+    the PDF itself and gives up once a page before its position has matched.
+    """
+    global _pool
+    workers = min(TABLE5_WORKERS, len(pages) // 4)
+    if len(pages) < PARALLEL_MIN_PAGES or workers < 2:
+        return _scan_range(str(pdf_path), pages)
+
+    with _pool_lock:
+        pool, best = _scan_pool()
+        slot = _free_slots.pop() if _free_slots else -1   # none free: no early stop
+        if slot >= 0:
+            best[slot] = max(pages) + 1
+    k = workers * 2                         # smaller chunks → earlier early-stop
+    size = -(-len(pages) // k)
+    chunks = [pages[j:j + size] for j in range(0, len(pages), size)]
+    try:
+        hits = list(pool.map(_scan_range, [str(pdf_path)] * len(chunks), chunks,
+                             [slot] * len(chunks)))
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None                # a worker died: start afresh next time
+        raise
+    finally:
+        if slot >= 0:
+            with _pool_lock:
+                _free_slots.append(slot)
+    found = [h for h in hits if h is not None]
+    return min(found) if found else None
+
+
+def find_table5_page(pdf_path: Path) -> int:
+    """
+    Index (0-based) of the Table-5 page.  Tier 1 ranks pages by score_pages
+    on raw text; tier 2 confirms the top TIER2_CANDIDATES with pdfplumber's
+    extract_text().  If none of them is it (or tier 1 had nothing to go on),
+    the rest of the document is scanned by _scan_pages.
+    """
+    texts = _page_texts(pdf_path)
     with pdfplumber.open(str(pdf_path)) as pdf:
-        for page in pdf.pages:
+        n = len(pdf.pages)
+        candidates = []
+        if texts is not None and len(texts) == n:
+            scores = score_pages(texts)
+            order = sorted(range(n), key=lambda i: -scores[i])
+            candidates = [i for i in order[:TIER2_CANDIDATES] if scores[i] >= 2]
+        for i in candidates:
+            page = pdf.pages[i]
             txt = (page.extract_text() or "").replace(" ", "")
-            if all(k in txt for k in REV_KEYWORDS) and any(m in txt for m in REV_MOZEA):
-                return page
-    raise RuntimeError("Table-5 page not found")
+            page.flush_cache()
+            if _is_table5(txt):
+                return i
+
+    hit = _scan_pages(pdf_path, [i for i in range(n) if i not in candidates])
+    if hit is None:
+        raise RuntimeError("Table-5 page not found")
+    return hit
 
 def extract_widest_table(page) -> List[List[str]]:
     tables = page.extract_tables()
@@ -58,7 +261,9 @@ def extract_widest_table(page) -> List[List[str]]:
     return max(tables, key=lambda t: len(t[0]))
 
 def table_to_tsv(table) -> str:
-    return "\n".join("\t".join(cell or "" for cell in row) for row in table)
+    # wrapped cells (e.g. 'גודל מגרש\n(מ"ר)') must not split a row in two
+    return "\n".join("\t".join(" ".join((cell or "").split()) for cell in row)
+                     for row in table)
 
 
 # ── 3. GPT prompt – canonical-or-fallback ─────────────────────────────────────
@@ -90,55 +295,134 @@ USER = (
     "המר/י אותה לפי ההנחיות.\n\n{tsv}"
 )
 
-def tsv_to_json(tsv: str) -> list:
-    resp = client.chat.completions.create(
-        model           = DEPLOYMENT_NAME,
-        response_format = {"type": "json_object"},
+HEADER_SYS = (
+    "מפה/י כל כותרת מהרשימה לכותרת הקנונית המתאימה לפי משמעות, או null אם "
+    "אין כזו. הכותרות עשויות להופיע בסדר תווים הפוך (RTL).\n"
+    "רשימת הכותרות הקנוניות:\n"
+    + "\n".join("• " + h for h in CANON) +
+    "\nהחזר/י JSON נקי בלבד: {\"<כותרת>\": \"<כותרת קנונית>\" | null}."
+)
+
+
+def llm_map_headers(headers: list[str]) -> dict:
+    """GPT-4o fallback for the few headers header_map can't place confidently."""
+    payload = json.dumps(headers, ensure_ascii=False)
+    return cached_chat(
+        (HEADER_SYS,), payload,
         messages=[
-            {"role": "system", "content": SYS},
-            {"role": "user",   "content": USER.format(tsv=tsv)},
+            {"role": "system", "content": HEADER_SYS},
+            {"role": "user",   "content": payload},
         ],
+        parse           = json.loads,
+        response_format = {"type": "json_object"},
         temperature=0,
-        max_tokens=2048,
+        max_tokens=512,
     )
-    reply = resp.choices[0].message.content.strip()
+
+
+header_mapper = HeaderMapper(CANON, resolve=llm_map_headers)
+
+
+def tsv_to_json(tsv: str) -> list | dict:
+    """Local header mapping + cell parsing; the full LLM conversion only as fallback."""
+    local = header_mapper.convert(tsv)
+    if local is not None:
+        return local
+    return tsv_to_json_llm(tsv)
+
+
+def _parse_json_reply(reply: str):
     if reply.startswith("```"):
         reply = re.sub(r"^```(?:json)?\s*", "", reply)
         reply = re.sub(r"\s*```$", "", reply)
     return json.loads(reply)
 
+
+def tsv_to_json_llm(tsv: str) -> list:
+    return cached_chat(
+        (SYS, USER), tsv,
+        messages=[
+            {"role": "system", "content": SYS},
+            {"role": "user",   "content": USER.format(tsv=tsv)},
+        ],
+        parse           = _parse_json_reply,
+        response_format = {"type": "json_object"},
+        temperature=0,
+        max_tokens=2048,
+    )
+
 tsv_to_json_via_chat = tsv_to_json
 
 
 # ── 4. OCR/vision fallback when table is an image ─────────────────────────────
+VISION_SYS  = ("Extract TSV (TAB between cells, NEWLINE between rows) "
+               "from the Hebrew table in the image. Output *only* TSV.")
+VISION_HINT = "טבלת זכויות – מצב מוצע"
+
 def tsv_from_image(page) -> str:
     img_bytes = page.to_image(resolution=300).original.stream.getvalue()
     b64 = base64.b64encode(img_bytes).decode()
     vision_msg = [
         {"role": "system",
-         "content": "Extract TSV (TAB between cells, NEWLINE between rows) "
-                    "from the Hebrew table in the image. Output *only* TSV."},
+         "content": VISION_SYS},
         {"role": "user",
          "content": [
              {"type": "image_url", "image_url": f"data:image/png;base64,{b64}"},
-             {"type": "text", "text": "טבלת זכויות – מצב מוצע"}]}
+             {"type": "text", "text": VISION_HINT}]}
     ]
-    resp = client.chat.completions.create(
-        model=DEPLOYMENT_NAME,
+    return cached_chat(
+        (VISION_SYS, VISION_HINT), img_bytes,
         messages=vision_msg,
         temperature=0,
         max_tokens=2048,
     )
-    return resp.choices[0].message.content.strip()
 
-# ── 5. Public helper for pipeline --------------------------------------------
+# ── 5. Public helpers for pipeline -------------------------------------------
+# Bump when find_table5_page / extract_widest_table / table_to_tsv change
+# what they produce for the same PDF.
+ARTIFACTS_VERSION = 2
+_artifacts = SqliteCache("table5_artifacts",
+                         max_entries=int(os.getenv("TABLE5_ARTIFACTS_MAX", "5000")))
+
+
+def pdf_sha256(pdf_path: Path) -> str:
+    stem = Path(pdf_path).stem
+    if re.fullmatch(r"[0-9a-f]{64}", stem):
+        return stem                         # pdf_cache blob: already named by its hash
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def table5_artifacts(pdf_path: Path, vision_fallback: bool = True) -> dict:
+    """
+    {"page", "table", "tsv", "source"} for the PDF's Table 5, cached by the
+    PDF's SHA-256.  `table` is the raw grid (None when the TSV came from the
+    vision fallback); `source` is "text" or "vision".
+    """
+    key = key_for({"sha256": pdf_sha256(pdf_path), "v": ARTIFACTS_VERSION})
+    hit = _artifacts.get(key)
+    if hit is not MISS:
+        return hit
+
+    page_no = find_table5_page(pdf_path)
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        page = pdf.pages[page_no]
+        try:
+            table = extract_widest_table(page)
+            art = {"page": page_no, "table": table, "tsv": table_to_tsv(table), "source": "text"}
+        except RuntimeError:
+            if not vision_fallback:
+                raise
+            art = {"page": page_no, "table": None, "tsv": tsv_from_image(page), "source": "vision"}
+    _artifacts.set(key, art)
+    return art
+
+
 def extract_table5_json(pdf_path: Path) -> list:
-    page = find_table5_page(pdf_path)
-    try:
-        tsv = table_to_tsv(extract_widest_table(page))
-    except RuntimeError:
-        tsv = tsv_from_image(page)
-    return tsv_to_json(tsv)
+    return tsv_to_json(table5_artifacts(pdf_path)["tsv"])
 
 # ── 6. CLI test ---------------------------------------------------------------
 if __name__ == "__main__":
@@ -1,17 +1,20 @@
 """
 geo_tools.py
 ------------
-address_to_plan(address_text) → dict with lat/lon and nearby plan numbers.
+address_to_plan(address_text, radius_km=0.1, k=None)
+    → dict with lat/lon and nearby plan numbers.
 """
 
 from getlonlat import (
-    llm_parse_address,
+    parse_address,
     geocode_parts,
     plans_within,
+    plans_nearest,
 )
 
 
-def address_to_plan(address_text: str) -> dict:
+def address_to_plan(address_text: str, radius_km: float = 0.1,
+                    k: int | None = None) -> dict:
     """
     Parse a free-form Israeli address, geocode it, return nearby plan hits.
 
@@ -19,6 +22,10 @@ def address_to_plan(address_text: str) -> dict:
     ----------
     address_text : str
         Free-form address (Hebrew or English).
+    radius_km : float
+        Search radius around the geocoded point (default 100 m).
+    k : int | None
+        If given, return the `k` nearest plans instead of a radius search.
 
     Returns
     -------
@@ -26,15 +33,20 @@ def address_to_plan(address_text: str) -> dict:
         {
           "lat": float,
           "lon": float,
-          "plans": [ { "Plan": "605-1288414", ... }, … ]
+          "plans": [ { "Plan": "605-1288414", "distance_km": 0.03,
+                       "sub_plans": [...], ... }, … ]   # one per core plan
         }
     """
-    parts = llm_parse_address(address_text)
+    parts = parse_address(address_text)
     if not parts:
-        raise ValueError("LLM failed to parse address")
+        raise ValueError("Failed to parse address")
 
     lat, lon = geocode_parts(parts)
     if lat is None:
         raise RuntimeError("Geocoder failed")
 
-    return {"lat": lat, "lon": lon, "plans": plans_within(lat, lon)}
+    if k:
+        plans = plans_nearest(lat, lon, k)
+    else:
+        plans = plans_within(lat, lon, radius_km)
+    return {"lat": lat, "lon": lon, "plans": plans}
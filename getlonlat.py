@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 # ────────────────────────────────────────────────────────────────
 # address_lookup.py  –  end-to-end demo: free-form address ➜ city-plans hit list
-# Requires:  pip install openai==1.*  azure-identity requests
+# Requires:  pip install openai==1.*  azure-identity httpx numpy
 # ────────────────────────────────────────────────────────────────
-import os, json, math, re, time, requests
+import os, json, asyncio
+import httpx
+import numpy as np
 from openai import AzureOpenAI
 
+import aio_loop
+from address_parser import PARSE_MIN_CONFIDENCE, normalize_text, parse_address_local
+import osm_geocoder
+import plan_index
+from kvcache import MISS, SqliteCache, key_for
+from rate_limit import RateLimited, RateLimiter, parse_retry_after
+
 # ── 1. Azure OpenAI credentials (▼ put YOURS here or use env vars) ─────────────
 AZURE_OAI_ENDPOINT  = os.getenv("AZURE_OAI_ENDPOINT",
     "https://ai-tomgurevich0575ai135301545538.openai.azure.com")
@@ -37,8 +46,27 @@ FUNC_SCHEMA = [{
     }
 }]
 
+# LLM answers are memoised on the normalised input text (LRU, shared by all
+# workers): "תל-חי 30, באר שבע" and "תל חי 30 באר שבע" cost one call in total.
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "50000"))
+_parse_cache = SqliteCache("address_parse", max_entries=PARSE_CACHE_SIZE)
+
+def parse_cache_stats() -> dict:
+    """Hit/miss counters (this process) and size of the LLM parse cache."""
+    return _parse_cache.stats()
+
 def llm_parse_address(user_text: str) -> dict | None:
     """Return dict {'street':..., 'number':..., 'city':..., 'country':...} or None."""
+    key = normalize_text(user_text)
+    cached = _parse_cache.get(key)
+    if cached is not MISS:
+        return cached
+    parsed = _llm_parse_address(user_text)
+    if parsed is not None:          # no function call may be transient: ask again next time
+        _parse_cache.set(key, parsed)
+    return parsed
+
+def _llm_parse_address(user_text: str) -> dict | None:
     resp = client.chat.completions.create(
         model       = DEPLOYMENT_NAME,   # deployment name
         messages    = [{"role":"user", "content": f"Parse this address: {user_text}"}],
@@ -52,92 +80,188 @@ def llm_parse_address(user_text: str) -> dict | None:
         return json.loads(msg.function_call.arguments)
     return None
 
-# ── 3. Geocoding helpers (Nominatim + Photon) ──────────────────────────────────
+def parse_address(user_text: str) -> dict | None:
+    """
+    Rule-based parse first (address_parser.py, no network); the LLM is only
+    asked when the local parser's confidence is below PARSE_MIN_CONFIDENCE.
+    """
+    parts, confidence = parse_address_local(user_text)
+    if parts and confidence >= PARSE_MIN_CONFIDENCE:
+        return parts
+    return llm_parse_address(user_text)
+
+# ── 3. Geocoding helpers (Nominatim + Photon, raced) ───────────────────────────
 UA = "MCP-Geocoder/2.0 (+tom.gurevich@example.com)"   # <-- your email/contact
 
-def _nominatim(query: str):
+# Nominatim is the better geocoder, so it gets a head start: if it answers
+# inside this window we take it; otherwise the first provider with a hit wins
+# and the other request is cancelled.
+GEOCODE_PREFER_S = float(os.getenv("GEOCODE_PREFER_S", "0.3"))
+
+# Shared per-provider budgets (all workers on this host): Nominatim's usage
+# policy is an absolute max of 1 req/s; Photon is more lenient.
+_LIMITS = {
+    "nominatim": RateLimiter("nominatim", rate=float(os.getenv("NOMINATIM_RPS", "1"))),
+    "photon":    RateLimiter("photon",    rate=float(os.getenv("PHOTON_RPS", "5")), burst=5),
+}
+GEOCODE_RETRIES = 2          # extra attempts after a 429
+
+_http: httpx.AsyncClient | None = None
+
+def _client() -> httpx.AsyncClient:
+    """Pooled keep-alive client, created on (and bound to) aio_loop's loop."""
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            headers={"User-Agent": UA},
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http
+
+async def _get(provider: str, url: str, params: dict) -> httpx.Response:
+    """GET inside the provider's rate budget; a 429 backs everybody off per Retry-After."""
+    limiter = _LIMITS[provider]
+    for _ in range(GEOCODE_RETRIES + 1):
+        await limiter.acquire()
+        r = await _client().get(url, params=params)
+        if r.status_code != 429:
+            break
+        await limiter.backoff(parse_retry_after(r.headers.get("Retry-After")))
+    return r
+
+async def _nominatim(query: str):
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": query, "format": "json", "limit": 1, "addressdetails":0,
               "countrycodes": "il"}
-    r = requests.get(url, params=params, headers={"User-Agent": UA}, timeout=10)
-    if r.status_code == 429:
-        time.sleep(1); r = requests.get(url, params=params, headers={"User-Agent": UA}, timeout=10)
-    if r.ok:
-        return r.json()
-    return []
+    r = await _get("nominatim", url, params)
+    r.raise_for_status()            # 5xx / final 429 is "no answer", not "no match"
+    return r.json()
 
-def _photon(query: str):
+async def _photon(query: str):
     url = "https://photon.komoot.io/api"
     params = {"q": query, "limit": 1, "lang": "he"}
-    r = requests.get(url, params=params, headers={"User-Agent": UA}, timeout=10)
-    if r.ok and r.json().get("features"):
-        lon, lat = r.json()["features"][0]["geometry"]["coordinates"]
+    r = await _get("photon", url, params)
+    r.raise_for_status()
+    features = r.json().get("features")
+    if features:
+        lon, lat = features[0]["geometry"]["coordinates"]
         return [{"lat": str(lat), "lon": str(lon)}]
     return []
 
-def geocode_parts(a: dict) -> tuple[float|None,float|None]:
-    """Return (lat,lon) or (None,None)."""
+async def _race(query: str) -> list:
+    """Query both providers concurrently; first valid hit wins, loser is cancelled."""
+    nom = asyncio.create_task(_nominatim(query))
+    pho = asyncio.create_task(_photon(query))
+    errors = []
+    try:
+        await asyncio.wait({nom}, timeout=GEOCODE_PREFER_S)
+        for fut in asyncio.as_completed({nom, pho}):
+            try:
+                hits = await fut
+            except (httpx.HTTPError, ValueError, RateLimited) as exc:
+                errors.append(exc)
+                continue
+            if hits:
+                return hits
+    finally:
+        nom.cancel(); pho.cancel()
+    if errors:
+        raise errors[0]     # a provider didn't answer – don't let the caller cache a miss
+    return []               # both answered 2xx with no hits: a real negative
+
+async def _geocode_remote(a: dict) -> tuple[float|None,float|None]:
     q = f"{a.get('street','')} {a.get('number','')}, {a['city']}, {a.get('country','Israel')}"
-    hits = _nominatim(q) or _photon(q)
+    hits = await _race(q)
     if hits:
         return float(hits[0]["lat"]), float(hits[0]["lon"])
     return None, None
 
-# ── 4. Simple Haversine distance (km) ──────────────────────────────────────────
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    p1, p2 = map(math.radians, (lat1, lat2))
-    dphi   = math.radians(lat2 - lat1)
-    dl     = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dl/2)**2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1-a))
+# ── 3b. Persistent geocode cache (SQLite, shared by all workers) ──────────────
+GEOCODE_TTL     = float(os.getenv("GEOCODE_TTL",     30 * 86_400))  # found: 30 days
+GEOCODE_NEG_TTL = float(os.getenv("GEOCODE_NEG_TTL",      86_400))  # not found: 1 day
+
+_geocode_cache = SqliteCache("geocode", ttl=GEOCODE_TTL)
+
+def _address_key(a: dict) -> str:
+    """Cache key: the parsed address with whitespace / case normalised."""
+    norm = lambda v: " ".join(str(v).split()).casefold()
+    return key_for({
+        "street":  norm(a.get("street") or ""),
+        "number":  norm(a.get("number") or ""),
+        "city":    norm(a.get("city") or ""),
+        "country": norm(a.get("country") or "Israel"),
+    })
+
+async def geocode_parts_async(a: dict) -> tuple[float|None,float|None]:
+    """
+    Return (lat,lon) or (None,None).  Tries the offline OSM index first (if
+    built, see osm_geocoder.py), then the cache, then the remote providers.
+    Only a miss both providers agreed on is negative-cached.
+    """
+    local = osm_geocoder.lookup(a)
+    if local:
+        return local
+
+    key = _address_key(a)
+    cached = _geocode_cache.get(key)
+    if cached is not MISS:
+        return tuple(cached) if cached else (None, None)
+
+    try:
+        lat, lon = await _geocode_remote(a)
+    except (httpx.HTTPError, ValueError, RateLimited):
+        return None, None           # a provider didn't answer: no verdict to cache
+    if lat is None:
+        _geocode_cache.set(key, None, ttl=GEOCODE_NEG_TTL)   # negative result
+    else:
+        _geocode_cache.set(key, [lat, lon])
+    return lat, lon
 
-# ── 5. City-plans fetch & filter ───────────────────────────────────────────────
+def geocode_parts(a: dict) -> tuple[float|None,float|None]:
+    """Sync facade over geocode_parts_async (runs on the shared aio_loop)."""
+    return aio_loop.run(geocode_parts_async(a))
+
+# ── 4. City-plans lookup (resident spatial index, see plan_index.py) ─────────
 PLANS_URL = (
     "https://data.gov.il/dataset/city-plans-br7/"
     "resource/183c23ae-13f4-47f9-b756-184547777e00/"
     "download/city-plans.json"
 )
 
-LOCAL_JSON = "city-plans.json"   # file you just downloaded
+LOCAL_JSON = plan_index.LOCAL_JSON   # file you just downloaded
 
 def plans_within(lat, lon, radius_km=0.1):
-    if not os.path.exists(LOCAL_JSON):
-        raise FileNotFoundError(
-            f"{LOCAL_JSON} not found – download it once from:\n"
-            "https://data.gov.il/dataset/city-plans-br7/resource/"
-            "183c23ae-13f4-47f9-b756-184547777e00/download/city-plans.json"
-        )
+    """
+    Plans within `radius_km` of (lat, lon), nearest first — one entry per core
+    plan, its sub-plan records aggregated under `sub_plans`.
+    """
+    return plan_index.get_index().within(lat, lon, radius_km)
+
+def plans_nearest(lat, lon, k=5):
+    """The `k` distinct core plans closest to (lat, lon), nearest first."""
+    return plan_index.get_index().nearest(lat, lon, k)
+
+def plans_within_many(points, radius_km=0.1):
+    """
+    Batch `plans_within`: `points` is an (N, 2) array-like of (lat, lon).
+    Returns N hit lists (input order) from one vectorised NumPy pass.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return plan_index.get_index().within_many(pts[:, 0], pts[:, 1], radius_km)
+
 
-    with open(LOCAL_JSON, "r", encoding="utf-8") as f:
-        all_items = json.load(f)           # whole JSON array
-
-    hits = [
-        item for item in all_items
-        if haversine(lat, lon,
-                     float(item["lat"]), float(item["lon"])) <= radius_km
-    ]
-    pat = re.compile(r"^(\d{3}-\d{7})(?:\(\d+\))?$")  # capture core, allow optional "(…)"
-    filtered = []
-    for item in hits:
-        m = pat.match(item["Plan"].strip())
-        if m:
-            item["Plan"] = m.group(1)  # keep only 605-0543108 part
-            filtered.append(item)
-    return filtered
-
-
-# ── 6. Demo main loop ──────────────────────────────────────────────────────────
+# ── 5. Demo main loop ──────────────────────────────────────────────────────────
 if __name__ == "__main__":
         raw = input("Enter any Israeli address (Heb/Eng): ").strip()
         if not raw:
             raise ValueError("Empty input.")
 
-        parsed = llm_parse_address(raw)
+        parsed = parse_address(raw)
         if not parsed:
-            raise RuntimeError("LLM could not parse that address.")
+            raise RuntimeError("Could not parse that address.")
 
-        print("LLM parsed:", parsed)
+        print("Parsed:", parsed)
 
         lat, lon = geocode_parts(parsed)
         if lat is None:
@@ -146,7 +270,7 @@ if __name__ == "__main__":
         print(f"Coordinates: {lat:.6f}, {lon:.6f}")
 
         hits = plans_within(lat, lon)
-        print(f"\n▶ Found {len(hits)} city-plan record(s) within 100 m:\n")
+        print(f"\n▶ Found {len(hits)} city plan(s) within 100 m:\n")
         print(json.dumps(hits, indent=2, ensure_ascii=False))
 
 
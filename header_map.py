@@ -0,0 +1,223 @@
+"""
+header_map.py
+-------------
+Local Table-5 TSV → JSON conversion: maps the PDF's Hebrew column headers
+onto the canonical keys without an LLM round-trip.
+
+    mapper = HeaderMapper(CANON, resolve=llm_map_headers)
+    result = mapper.convert(tsv)        # → {"data": [row, …]} or None
+
+• Header text is normalised (quotes, brackets, punctuation, final letters,
+  whitespace) and compared in both reading directions, because pdfplumber
+  often returns Hebrew in visual (reversed) order.
+• A header maps to a canonical key by, in order: the learned dictionary
+  (SqliteCache "header_synonyms", keyed per canonical-key set so a schema
+  change starts afresh), the built-in SYNONYMS, or fuzzy matching
+  (difflib ratio / token overlap).  Each canonical key is used at most once.
+• Headers scoring in the grey zone (below HEADER_MIN_CONFIDENCE, above
+  HEADER_NO_MATCH) are sent in one small batch to `resolve` (the LLM); its
+  answers are written back to the dictionary, so they're local next time.
+• Unmapped columns keep their original header, as the LLM prompt asks.
+• Cells: numbers ("1,234.5", "45%", footnoted "(2) 56") become int/float,
+  blanks, dashes and bare footnote markers become None, everything else is
+  a whitespace-normalised string.
+
+`convert` returns None when the table doesn't look like Table 5 (fewer than
+two canonical columns, or body rows whose width differs from the header's)
+— callers fall back to the full LLM conversion.
+"""
+
+from __future__ import annotations
+
+import difflib
+import hashlib
+import os
+import re
+from typing import Callable
+
+from kvcache import MISS, SqliteCache
+
+HEADER_MIN_CONFIDENCE = float(os.getenv("HEADER_MIN_CONFIDENCE", "0.8"))
+HEADER_NO_MATCH       = float(os.getenv("HEADER_NO_MATCH", "0.45"))
+MIN_CANON_COLUMNS     = 2
+
+# canonical key → header variants seen in plan PDFs (compared normalised)
+SYNONYMS: dict[str, list[str]] = {
+    "שם התכנית ייעוד תא שטח": ["יעוד", "ייעוד", "תא שטח", "תאי שטח", "יעוד תא שטח",
+                               "ייעוד תאי שטח", "שם התכנית"],
+    "סה\"כ מ\"ר":             ["גודל מגרש", "גודל מגרש מ\"ר", "שטח מגרש", "שטח התא"],
+    "שטח תכסית )%(":          ["תכסית", "תכסית %", "תכסית % משטח התא", "אחוז תכסית"],
+    "הפקעה )מ\"ר(":           ["הפקעה", "שטח הפקעה", "שטח להפקעה"],
+    "שטח למבנה ציבור )מ\"ר(": ["מבני ציבור", "שטח לבנייני ציבור", "שטח למבני ציבור"],
+    "סה\"כ שטח בניה )מ\"ר(":  ["סה\"כ שטחי בניה", "סה\"כ שטחי בנייה", "סה\"כ שטח בנייה",
+                               "שטחי בניה סה\"כ"],
+    "קומות מעל הקרקע":        ["מספר קומות מעל הכניסה הקובעת", "קומות מעל הכניסה הקובעת",
+                               "מעל הכניסה הקובעת", "קומות מעל"],
+    "קומות מתחת הקרקע":       ["מספר קומות מתחת לכניסה הקובעת", "קומות מתחת לכניסה הקובעת",
+                               "מתחת לכניסה הקובעת", "קומות מתחת"],
+    "רחק":                    ["מרחק"],
+}
+
+_PUNCT = re.compile(r"[\"'״׳`()\[\]{}%:;.,/\\\-–—_*]+")
+_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+_NUMBER = re.compile(r"^[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?$|^[-+]?\d+(?:\.\d+)?$")
+_EMPTY = {"", "-", "–", "—", "--", "---"}
+_FOOTNOTE = re.compile(r"^\(\d{1,2}\)\s*|\s*\(\d{1,2}\)$")     # "(2) 56", "56 (2)"
+
+
+def normalize_header(text: str) -> str:
+    """Comparison form of a header: no punctuation/brackets/finals, single spaces."""
+    text = _PUNCT.sub(" ", (text or "").replace("\n", " ")).translate(_FINALS)
+    return " ".join(text.split())
+
+
+def _forms(text: str) -> tuple[str, str]:
+    """(as-is, character-reversed) normalised forms — visual vs logical order."""
+    norm = normalize_header(text)
+    return norm, " ".join(norm[::-1].split())
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    ratio = difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+    ta, tb = set(a.split()), set(b.split())
+    overlap = len(ta & tb) / len(ta | tb)
+    return max(ratio, overlap)
+
+
+def parse_cell(text: str | None):
+    """Local numeric parsing (footnote markers dropped): int / float / None / cleaned string."""
+    if text is None:
+        return None
+    s = " ".join(str(text).split())
+    if s in _EMPTY:
+        return None
+    bare = _FOOTNOTE.sub("", s).rstrip("%").strip()
+    if bare in _EMPTY:
+        return None                         # a footnote marker alone, e.g. "(3)"
+    if _NUMBER.match(bare):
+        value = float(bare.replace(",", ""))
+        return int(value) if value.is_integer() and "." not in bare else value
+    return s
+
+
+class HeaderMapper:
+    """Canonical-key mapping for one schema (e.g. extract_table5.CANON)."""
+
+    def __init__(self, canon: list[str],
+                 resolve: Callable[[list[str]], dict[str, str | None]] | None = None,
+                 min_confidence: float = HEADER_MIN_CONFIDENCE,
+                 no_match: float = HEADER_NO_MATCH):
+        self.canon = list(canon)
+        self.resolve = resolve
+        self.min_confidence = min_confidence
+        self.no_match = no_match
+        self.learned = SqliteCache("header_synonyms")
+        # learned answers are only valid for the schema they were given against
+        self._ns = hashlib.sha256("\n".join(self.canon).encode("utf-8")).hexdigest()[:12]
+        self._canon_norm = {c: normalize_header(c) for c in self.canon}
+        self._synonyms: dict[str, str] = {}
+        for c in self.canon:
+            for variant in (c, *SYNONYMS.get(c, [])):
+                self._synonyms[normalize_header(variant)] = c
+
+    # ── scoring ──────────────────────────────────────────────────────────────
+    def _lookup(self, header: str) -> str | None | object:
+        """Learned or built-in mapping for `header` (canonical / None), or MISS."""
+        for form in _forms(header):
+            learned = self.learned.get(f"{self._ns}:{form}")
+            if learned is not MISS and (not learned or learned in self.canon):
+                return learned or None          # "" = learned "no canonical key"
+            if form in self._synonyms:
+                return self._synonyms[form]
+        return MISS
+
+    def score(self, header: str) -> list[tuple[float, str]]:
+        """(confidence, canonical key) for every key, best first."""
+        known = self._lookup(header)
+        if known is not MISS:
+            return [(1.0, known)] if known else []
+        fwd, rev = _forms(header)
+        scored = []
+        for c, cn in self._canon_norm.items():
+            best = max(_similarity(fwd, cn), _similarity(rev, cn))
+            for variant in SYNONYMS.get(c, []):
+                vn = normalize_header(variant)
+                best = max(best, _similarity(fwd, vn), _similarity(rev, vn))
+            scored.append((round(best, 3), c))
+        return sorted(scored, reverse=True)
+
+    def map_headers(self, headers: list[str]) -> list[str | None]:
+        """Canonical key (or None = keep original) per header; LLM only for grey-zone ones."""
+        scores = {h: self.score(h) for h in headers if normalize_header(h)}
+        unsure = [h for h, s in scores.items()
+                  if s and self.no_match <= s[0][0] < self.min_confidence]
+        if unsure and self.resolve is not None:
+            answers = self.resolve(unsure)
+            # the model may echo keys/values trimmed or normalised: match on that
+            replies = {normalize_header(k): v for k, v in answers.items()
+                       if isinstance(k, str)} if isinstance(answers, dict) else {}
+            canon_of = {n: c for c, n in self._canon_norm.items()}
+            for h in unsure:
+                key = normalize_header(h)
+                if key not in replies:
+                    continue                    # no answer: keep the fuzzy score, learn nothing
+                reply = replies[key]
+                choice = canon_of.get(normalize_header(reply)) if isinstance(reply, str) else None
+                if reply is not None and choice is None:
+                    continue                    # not a canonical key: don't persist a guess
+                self.learned.set(f"{self._ns}:{_forms(h)[0]}", choice or "")
+                scores[h] = [(1.0, choice)] if choice else []
+
+        # greedy one-to-one assignment, most confident pairs first
+        pairs = sorted(((conf, i, c) for i, h in enumerate(headers)
+                        for conf, c in scores.get(h, [])
+                        if conf >= self.min_confidence), reverse=True)
+        out: list[str | None] = [None] * len(headers)
+        used: set[str] = set()
+        for conf, i, c in pairs:
+            if out[i] is None and c not in used:
+                out[i] = c
+                used.add(c)
+        return out
+
+    # ── conversion ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _split_header(rows: list[list[str]]) -> tuple[list[str], list[list[str]]]:
+        """Merge multi-row headers: keep absorbing rows while the header has gaps."""
+        header = [c.strip() for c in rows[0]]
+        k = 1
+        while (k < len(rows) and k < 3 and any(not c for c in header)
+               and not any(isinstance(parse_cell(c), (int, float)) for c in rows[k])):
+            header = [" ".join(p for p in (h, (rows[k][j] if j < len(rows[k]) else "").strip()) if p)
+                      for j, h in enumerate(header)]
+            k += 1
+        return header, rows[k:]
+
+    def convert(self, tsv: str) -> dict | None:
+        rows = [line.split("\t") for line in tsv.splitlines() if line.strip()]
+        if len(rows) < 2 or len(rows[0]) < 2:
+            return None
+        header, body = self._split_header(rows)
+        if any(len(row) != len(header) for row in body):
+            return None                         # ragged grid: cells were split or merged
+        mapped = self.map_headers(header)
+        if sum(m is not None for m in mapped) < MIN_CANON_COLUMNS:
+            return None
+
+        keys, seen = [], {}
+        for h, m in zip(header, mapped):
+            key = m or " ".join(h.split()) or f"col{len(keys) + 1}"
+            seen[key] = seen.get(key, 0) + 1
+            keys.append(key if seen[key] == 1 else f"{key} ({seen[key]})")
+
+        data = []
+        for row in body:
+            cells = [parse_cell(row[j]) if j < len(row) else None for j in range(len(keys))]
+            if all(c is None for c in cells):
+                continue
+            if [normalize_header(str(c or "")) for c in cells] == [normalize_header(h) for h in header]:
+                continue                        # header repeated on a page break
+            data.append(dict(zip(keys, cells)))
+        return {"data": data}
@@ -0,0 +1,119 @@
+"""
+kvcache.py
+----------
+Tiny persistent key/value cache on SQLite, shared by every worker process.
+
+    cache = SqliteCache("geocode", ttl=30 * 86400)
+    cache.set(key, value)          # value: anything JSON-serialisable
+    cache.get(key)                 # → value, or MISS if absent / expired
+    cache.stats()                  # → {"hits": …, "misses": …, "entries": …}
+
+• One table per cache inside CACHE_DIR/<name>.sqlite (WAL mode, so readers
+  in other processes never block on a writer).
+• Optional TTL per entry, optional LRU eviction by entry count.
+• Connections are per thread; SQLite does the cross-process locking.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+CACHE_DIR = Path(os.getenv("ARCH_CACHE_DIR", ".cache"))
+
+MISS = object()           # sentinel: distinguishes "cached None" from "not cached"
+
+
+def key_for(obj: Any) -> str:
+    """Stable SHA-256 key for any JSON-serialisable object."""
+    blob = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SqliteCache:
+    """Persistent JSON cache with TTL and LRU eviction."""
+
+    def __init__(self, name: str, ttl: float | None = None,
+                 max_entries: int | None = None, path: str | Path | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path else CACHE_DIR / f"{name}.sqlite"
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    # ── connection ───────────────────────────────────────────────────────────
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache(last_used)")
+            self._local.db = db
+        return db
+
+    # ── API ──────────────────────────────────────────────────────────────────
+    def get(self, key: str, default: Any = MISS) -> Any:
+        now = time.time()
+        row = self._db().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < now):
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self.max_entries:
+            self._db().execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl else None
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, last_used)"
+            " VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires, now),
+        )
+        if self.max_entries:
+            db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        self._db().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        cur = self._db().execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (time.time(),),
+        )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        (entries,) = self._db().execute("SELECT COUNT(*) FROM cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "name":     self.name,
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "entries":  entries,
+        }
@@ -97,7 +97,7 @@ exec_agent = UserProxyAgent(
 exec_agent.register_for_execution(name="address_to_plan")(geo_tools.address_to_plan)
 exec_agent.register_for_execution(name="plan_to_json")(pdf_tools.plan_to_json)
 
-# (Optional) expose get_plan_pdf too in case the LLM ever needs raw PDF bytes
+# (Optional) expose get_plan_pdf too in case the LLM ever needs the raw PDF (→ local path)
 exec_agent.register_for_execution(name="get_plan_pdf")(pdf_tools.TOOL_MAP["get_plan_pdf"])
 
 # ── Termination: stop when final message is a dict or JSON blob ────────────────
@@ -1,11 +1,22 @@
 """
-An MCP server that exposes a single `get_plan_pdf` tool.
+An MCP server that exposes the `get_plan_pdf` / `get_plan_pdfs` tools.
 
 How it works
 ------------
 * We wrap your Playwright routine in an MCP *tool* so that LLM agents
   (or any MCP client) can discover and invoke it.
-* The tool returns the PDF as a Base-64 string so it remains JSON-serialisable.
+* The tool returns a small *artifact handle* instead of the PDF itself:
+  {"path", "uri", "sha256", "size", "chunk_size", "chunks"}.  A client on the
+  same host opens `path` (or its own pdf_cache by sha256) directly — no bytes
+  cross the transport.  A remote client reads the blob resource
+  `mavat://pdf/{sha256}/{chunk}` one chunk at a time, so neither side ever
+  holds more than `chunk_size` bytes of a 50 MB plan in a JSON frame.
+* PDFs are kept in a content-addressed disk cache (pdf_cache.py); repeat
+  calls are served from it and only stale entries are revalidated upstream.
+* `get_plan_pdfs` fetches a whole list of plans in one call, at most
+  MCP_BATCH_CONCURRENCY at a time, reporting progress as each one finishes.
+* Chromium is not launched per call: a pool of warm browsers (browser_pool.py)
+  is started with the server and each call gets an isolated context.
 * You can launch the server over:
     • stdio  (perfect for local dev or Docker “exec” style usage)
     • streamable-http  (good for remote deployment behind an HTTPS proxy)
@@ -16,11 +27,28 @@ Requires:
 """
 
 import asyncio
-import base64
-from pathlib import Path
+import json
+import os
+from contextlib import asynccontextmanager
+
+from mcp.server.fastmcp import Context, FastMCP
+
+import pdf_cache
+from mavat_scraper import cached_plan_pdf, metrics, pool
+
+PDF_CHUNK_BYTES = int(os.getenv("MCP_PDF_CHUNK_BYTES", str(1 << 20)))
+BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Warm the browser pool before the first call; close it on shutdown."""
+    await pool.start()
+    try:
+        yield {"browser_pool": pool}
+    finally:
+        await pool.stop()
 
-from mcp.server.fastmcp import FastMCP
-from playwright.async_api import async_playwright, TimeoutError as PWTimeoutError
 
 # ---------------------------------------------------------------------
 # Create an MCP server object (name + semver are just metadata)
@@ -31,15 +59,18 @@ mcp = FastMCP(
     instructions=(
         "This server lets you download raw PDF documents for statutory "
         "plans listed in Israel's MaVaT planning portal. Call the "
-        "`get_plan_pdf` tool with a numeric plan identifier."
+        "`get_plan_pdf` tool with a numeric plan identifier (or "
+        "`get_plan_pdfs` with a list of them); it returns a handle whose "
+        "chunks are read from the mavat://pdf/{sha256}/{chunk} resource."
     ),
+    lifespan=lifespan,
 )
 
 # ---------------------------------------------------------------------
 # Tool: get_plan_pdf
 # ---------------------------------------------------------------------
 @mcp.tool()
-async def get_plan_pdf(plan_number: str) -> str:
+async def get_plan_pdf(plan_number: str) -> dict:
     """
     Download the raw PDF for a given MaVaT plan number.
 
@@ -50,50 +81,98 @@ async def get_plan_pdf(plan_number: str) -> str:
 
     Returns
     -------
-    str
-        The PDF encoded as a base-64 string.  (Clients typically write it
-        straight to disk after `base64.b64decode`.)
+    dict
+        Artifact handle: local `path`, resource `uri` prefix, `sha256`,
+        `size`, `chunk_size` and the number of `chunks` to read from
+        `{uri}/{chunk}` when `path` isn't reachable from the client.
+    """
+    return await _artifact(plan_number)
+
+
+async def _artifact(plan_number: str) -> dict:
+    """Fetch (or reuse) the plan's PDF and describe it as an artifact handle."""
+    pdf_path = await cached_plan_pdf(plan_number)
+    sha256 = pdf_path.stem                      # blobs are named by content hash
+    size = pdf_path.stat().st_size
+    return {
+        "plan_number": plan_number,
+        "path":        str(pdf_path.resolve()),
+        "uri":         f"mavat://pdf/{sha256}",
+        "sha256":      sha256,
+        "size":        size,
+        "chunk_size":  PDF_CHUNK_BYTES,
+        "chunks":      max(1, -(-size // PDF_CHUNK_BYTES)),
+        "mime_type":   "application/pdf",
+    }
+
+
+# ---------------------------------------------------------------------
+# Tool: get_plan_pdfs (batch)
+# ---------------------------------------------------------------------
+@mcp.tool()
+async def get_plan_pdfs(plan_numbers: list[str], ctx: Context,
+                        max_parallel: int | None = None) -> dict:
+    """
+    Download the raw PDFs for several MaVaT plan numbers in one call.
+
+    Args
+    ----
+    plan_numbers : list[str]
+        Plan identifiers; duplicates are fetched once.
+    max_parallel : int, optional
+        Concurrency cap for this call (never above MCP_BATCH_CONCURRENCY).
+
+    Returns
+    -------
+    dict
+        {"results": [...], "ok": n, "failed": m} — one entry per plan, in
+        input order: the `get_plan_pdf` handle plus "ok": true, or
+        {"plan_number", "ok": false, "error"}.  A progress notification is
+        sent as each plan finishes.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
-
-        target = f"https://mavat.iplan.gov.il/SV3?text={plan_number}"
-
-        try:
-            await page.goto(target, wait_until="load", timeout=30_000)
-        except PWTimeoutError:
-            # Some MaVaT pages are slow – we continue anyway.
-            pass
-
-        await page.wait_for_timeout(1_000)
-
-        # MaVaT sometimes bounces back to SV3; go “Back” if that happens.
-        if page.url != target:
-            await page.go_back(wait_until="load", timeout=10_000)
-            await page.wait_for_timeout(500)
-
-        # Open accordion panes & click the PDF icon (same xpath you had).
-        await page.click("div.uk-accordion-title:has-text('מסמכי התכנית')")
-        await page.wait_for_timeout(300)
-        await page.click("div.uk-accordion-title.title-b:has-text('מסמכים בתהליך')")
-        await page.wait_for_timeout(300)
-        await page.click("span.uk-text-lead:has-text('הוראות')")
-        await page.wait_for_timeout(300)
-
-        async with page.expect_download(timeout=20_000) as dl_info:
-            await page.click('img.sv4-icon-file.pdf-download[title="ראה קובץ בפורמט PDF"]')
-
-        download = await dl_info.value
-        path: str | None = await download.path()
-        if not path:
-            raise RuntimeError("Download failed – MaVaT did not return a file.")
-
-        pdf_bytes = Path(path).read_bytes()
-
-        # 🡆 Return as base-64 text for easy transport over MCP JSON-RPC.
-        return base64.b64encode(pdf_bytes).decode()
+    plans = list(dict.fromkeys(p.strip() for p in plan_numbers if p.strip()))
+    limit = max(1, min(max_parallel or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    sem = asyncio.Semaphore(limit)
+    done = 0
+
+    async def one(plan_number: str) -> dict:
+        nonlocal done
+        async with sem:
+            try:
+                result = {**await _artifact(plan_number), "ok": True}
+            except Exception as exc:            # per-plan failure, batch goes on
+                result = {"plan_number": plan_number, "ok": False,
+                          "error": f"{type(exc).__name__}: {exc}"}
+        done += 1
+        await ctx.report_progress(done, len(plans))
+        return result
+
+    results = await asyncio.gather(*(one(p) for p in plans))
+    ok = sum(r["ok"] for r in results)
+    return {"results": results, "ok": ok, "failed": len(results) - ok}
+
+
+# ---------------------------------------------------------------------
+# Resource: the cached PDF bytes, one chunk per read
+# ---------------------------------------------------------------------
+@mcp.resource("mavat://pdf/{sha256}/{chunk}", mime_type="application/pdf")
+def plan_pdf_chunk(sha256: str, chunk: str) -> bytes:
+    """Chunk `chunk` (0-based, MCP_PDF_CHUNK_BYTES each) of a cached plan PDF."""
+    path = pdf_cache.blob(sha256)
+    if path is None:
+        raise ValueError(f"unknown PDF {sha256} – call get_plan_pdf first")
+    with open(path, "rb") as f:
+        f.seek(int(chunk) * PDF_CHUNK_BYTES)
+        return f.read(PDF_CHUNK_BYTES)
+
+# ---------------------------------------------------------------------
+# Resource: health / metrics (circuit breaker, latencies, pool, cache)
+# ---------------------------------------------------------------------
+@mcp.resource("mavat://metrics", mime_type="application/json")
+def scraper_metrics() -> str:
+    """Circuit-breaker state, MaVaT step latencies, browser pool and PDF cache."""
+    return json.dumps(metrics(), ensure_ascii=False)
+
 
 # ---------------------------------------------------------------------
 # Entrypoint – choose your transport.
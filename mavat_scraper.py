@@ -0,0 +1,434 @@
+"""
+mavat_scraper.py
+----------------
+The MaVaT "plan instructions PDF" routine, shared by mavat_mcp.py (MCP tool)
+and server.py (FastAPI endpoint).
+
+    pdf_bytes = await fetch_plan_pdf(plan_number)
+    pdf_path  = await cached_plan_pdf(plan_number)     # via pdf_cache.py
+
+The first fetch of a plan drives Chromium (a warm context from the
+process-wide BrowserPool, see browser_pool.py) and records the HTTP request
+that finally produced the PDF.  Later fetches replay that request directly
+over a pooled httpx client — one round-trip — and only fall back to the
+browser when the recorded request stops returning a PDF.
+
+`cached_plan_pdf` puts the on-disk PDF cache (pdf_cache.py) in front of
+that: a fresh entry costs nothing, a stale one is revalidated with a
+conditional replay (304 → keep the blob), and only a miss downloads.
+Concurrent calls for one plan — in this process or another worker — share a
+single fetch (singleflight.py).
+
+No fixed sleeps: every step waits for the thing it actually needs — the
+plan's accordion to render (or the SPA to bounce us to another URL), each
+pane's next title to become clickable, the download event — and each step's
+latency is logged (logger "mavat_scraper") so slow stages are visible.
+Images, fonts, media and trackers are not fetched at all (route_policy.py).
+
+A circuit breaker (circuit_breaker.py) guards MaVaT: after repeated
+failures calls fail fast with CircuitOpen instead of waiting out every
+timeout, a cached copy is served even when stale, and each step's timeout
+shrinks to a multiple of its observed p95.  `metrics()` exposes the state.
+Only MaVaT's own trouble (navigation/network errors, 5xx, hung calls) counts
+against the breaker; a plan without an instructions PDF, or an unknown plan
+number, raises PlanUnavailable and leaves it closed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+from playwright.async_api import Page, Request, Response
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+import pdf_cache
+from browser_pool import BrowserPool
+from circuit_breaker import CircuitBreaker
+from kvcache import MISS, SqliteCache
+from route_policy import RoutePolicy
+from singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+pool = BrowserPool()    # started / stopped by the server lifespan
+flights = SingleFlight("mavat")
+route_policy = RoutePolicy.from_env()
+breaker = CircuitBreaker(
+    "mavat",
+    failure_threshold=int(os.getenv("MAVAT_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("MAVAT_BREAKER_RESET_S", "30")),
+)
+_stale_served = 0
+
+MAVAT_URL = "https://mavat.iplan.gov.il/SV3?text={plan_number}"
+
+SEL_DOCS     = "div.uk-accordion-title:has-text('מסמכי התכנית')"
+SEL_PENDING  = "div.uk-accordion-title.title-b:has-text('מסמכים בתהליך')"
+SEL_RULES    = "span.uk-text-lead:has-text('הוראות')"
+SEL_PDF_ICON = 'img.sv4-icon-file.pdf-download[title="ראה קובץ בפורמט PDF"]'
+
+NAV_TIMEOUT_MS   = 30_000
+STEP_TIMEOUT_MS  = 10_000
+DL_TIMEOUT_MS    = 20_000
+
+# plan number → the request that produced its PDF (url, method, headers, body)
+_direct = SqliteCache("mavat_direct")
+_VALIDATORS = ("etag", "last-modified")
+_REPLAY_HEADERS = {"accept", "accept-language", "content-type", "referer", "origin",
+                   "user-agent", "x-requested-with"}
+
+_http: httpx.AsyncClient | None = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=DL_TIMEOUT_MS / 1000, follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http
+
+
+class PlanUnavailable(RuntimeError):
+    """MaVaT answered, but the plan (or its instructions PDF) isn't there."""
+
+
+class StepTimer:
+    """Collects per-step wall-clock latencies (ms) for one scrape."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.steps: dict[str, float] = {}
+        self.failed: str | None = None
+
+    @contextmanager
+    def step(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed = name
+            raise
+        finally:
+            self.steps[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def completed(self) -> dict[str, float]:
+        """Seconds per step that finished (a timed-out step isn't a latency sample)."""
+        return {k: v / 1000 for k, v in self.steps.items() if k != self.failed}
+
+    def report(self) -> None:
+        total = sum(self.steps.values())
+        parts = " ".join(f"{k}={v:.0f}ms" for k, v in self.steps.items())
+        log.info("%s: %s total=%.0fms", self.label, parts, total)
+
+
+def _timeout(step: str, default_ms: float) -> float:
+    return breaker.timeout_ms(step, default_ms)
+
+
+class _Traffic:
+    """Whether MaVaT itself misbehaved during a page load: 5xx, network errors, hung calls."""
+
+    _CALLS = ("document", "xhr", "fetch")
+
+    def __init__(self, page: Page):
+        self.pending: set[Request] = set()
+        self.errors: list[str] = []
+        page.on("request", self._started)
+        page.on("requestfinished", self.pending.discard)
+        page.on("requestfailed", self._failed)
+        page.on("response", self._response)
+
+    def _started(self, request: Request) -> None:
+        if request.resource_type in self._CALLS:
+            self.pending.add(request)
+
+    def _failed(self, request: Request) -> None:
+        self.pending.discard(request)
+        failure = request.failure or ""
+        if request.resource_type in self._CALLS and "BLOCKED_BY_CLIENT" not in failure.upper():
+            self.errors.append(f"{failure} {request.url}")   # not one route_policy aborted
+
+    def _response(self, response: Response) -> None:
+        if response.status >= 500:
+            self.errors.append(f"HTTP {response.status} {response.url}")
+
+    def upstream_fault(self) -> str | None:
+        if self.errors:
+            return self.errors[0]
+        if self.pending:
+            return f"{len(self.pending)} MaVaT request(s) never answered"
+        return None
+
+    @contextmanager
+    def plan_specific(self, plan_number: str, what: str):
+        """A selector timeout on a healthy page means this plan lacks `what`."""
+        try:
+            yield
+        except PlaywrightTimeoutError as exc:
+            if self.upstream_fault() is not None:
+                raise
+            raise PlanUnavailable(f"mavat {plan_number}: {what} not found") from exc
+
+
+async def _wait_for_plan_page(page: Page, target: str, timeout_ms: float = NAV_TIMEOUT_MS) -> None:
+    """
+    Wait until the plan's documents accordion is visible.  MaVaT sometimes
+    bounces to another SV3 URL instead; whichever happens first decides, and
+    on a bounce we go back and wait for the accordion there.
+    """
+    docs = page.locator(SEL_DOCS).first
+    rendered = asyncio.ensure_future(docs.wait_for(state="visible", timeout=timeout_ms))
+    bounced = asyncio.ensure_future(
+        page.wait_for_url(lambda url: url != target, timeout=timeout_ms))
+    try:
+        done, _ = await asyncio.wait({rendered, bounced}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for fut in (rendered, bounced):
+            if not fut.done():
+                fut.cancel()
+        await asyncio.gather(rendered, bounced, return_exceptions=True)
+
+    first = done.pop()
+    if first.exception() is not None:
+        raise first.exception()          # the page never rendered / timed out
+    if first is bounced:
+        await page.go_back(wait_until="domcontentloaded", timeout=STEP_TIMEOUT_MS)
+        await docs.wait_for(state="visible", timeout=STEP_TIMEOUT_MS)
+
+
+def _record_direct(plan_number: str, url: str, request: Request | None) -> None:
+    """Remember how the PDF was fetched so the next fetch can skip the browser."""
+    if not url.startswith("http"):
+        return                            # blob:/data: downloads can't be replayed
+    entry = {"url": url, "method": "GET", "headers": {}, "body": None}
+    if request is not None:
+        entry["method"] = request.method
+        entry["headers"] = {k: v for k, v in request.headers.items()
+                            if k.lower() in _REPLAY_HEADERS}
+        entry["body"] = request.post_data
+    _direct.set(plan_number, entry)
+
+
+async def fetch_direct(plan_number: str, dest: Path,
+                       headers: dict | None = None) -> httpx.Response | None:
+    """
+    Replay the recorded PDF request for `plan_number` (None if none recorded),
+    streaming a 200 body into `dest` so a 50 MB PDF never sits in memory.
+    Extra `headers` (e.g. If-None-Match) are sent along for revalidation.
+    """
+    entry = _direct.get(plan_number)
+    if entry is MISS:
+        return None
+    async with _client().stream(
+            entry["method"], entry["url"],
+            headers={**entry["headers"], **(headers or {})},
+            content=entry["body"]) as resp:
+        if resp.status_code == 200:
+            with open(dest, "wb") as f:
+                async for chunk in resp.aiter_bytes(1 << 20):
+                    f.write(chunk)
+    return resp
+
+
+def _is_pdf(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(4) == b"%PDF"
+
+
+def _validators(headers) -> dict:
+    """ETag / Last-Modified of a response, as pdf_cache.put keyword arguments."""
+    return {k.replace("-", "_"): headers[k] for k in _VALIDATORS if headers.get(k)}
+
+
+async def _fetch_direct_pdf(plan_number: str,
+                            headers: dict | None = None) -> tuple[Path | None, httpx.Response | None]:
+    """(temp file holding the PDF or None, response or None) from the recorded request."""
+    if breaker.is_open:
+        return None, None                 # MaVaT is down: don't even try
+    t0 = time.perf_counter()
+    dest = pdf_cache.tmp_file()
+    try:
+        resp = await fetch_direct(plan_number, dest, headers)
+    except BaseException as exc:
+        dest.unlink(missing_ok=True)
+        if not isinstance(exc, httpx.HTTPError):
+            raise
+        log.info("mavat %s: direct fetch failed (%s), using browser", plan_number, exc)
+        return None, None
+    if resp is not None and (resp.status_code == 304
+                             or (resp.status_code == 200 and _is_pdf(dest))):
+        breaker.success({"direct": time.perf_counter() - t0})
+        if resp.status_code == 200:
+            return dest, resp
+        return None, resp
+    dest.unlink(missing_ok=True)
+    if resp is None:
+        return None, None
+    status = resp.status_code
+    if status >= 500:                     # MaVaT trouble, not a stale URL: keep the entry
+        log.info("mavat %s: direct fetch got HTTP %s", plan_number, status)
+        breaker.failure(httpx.HTTPStatusError(f"HTTP {status}", request=resp.request,
+                                              response=resp))
+    elif status == 429:
+        log.info("mavat %s: direct fetch throttled (HTTP 429)", plan_number)
+    elif status == 200 or 400 <= status < 500:
+        log.info("mavat %s: recorded PDF URL went stale (HTTP %s)", plan_number, status)
+        _direct.delete(plan_number)
+    return None, resp
+
+
+async def _fetch(plan_number: str) -> tuple[Path, dict]:
+    """(temp file, validators): direct HTTP replay if known, else the browser."""
+    pdf, resp = await _fetch_direct_pdf(plan_number)
+    if pdf is not None:
+        return pdf, _validators(resp.headers)
+    return await _browser_fetch(plan_number)
+
+
+def _read_and_remove(path: Path) -> bytes:
+    try:
+        return path.read_bytes()
+    finally:
+        path.unlink(missing_ok=True)
+
+
+async def fetch_plan_pdf(plan_number: str) -> bytes:
+    """PDF bytes for `plan_number`: direct HTTP replay if known, else the browser."""
+    return _read_and_remove((await _fetch(plan_number))[0])
+
+
+async def cached_plan_pdf(plan_number: str) -> Path:
+    """Path of the plan's PDF in pdf_cache, downloading or revalidating as needed."""
+    return await flights.run(plan_number, lambda: _cached_plan_pdf(plan_number))
+
+
+async def _cached_plan_pdf(plan_number: str) -> Path:
+    entry = pdf_cache.lookup(plan_number)
+    if entry is None:
+        pdf, validators = await _fetch(plan_number)
+        return pdf_cache.put_file(plan_number, pdf, **validators)
+    if pdf_cache.is_fresh(entry):
+        return entry["path"]
+    if breaker.is_open:
+        return _serve_stale(entry, "circuit open")
+    try:
+        pdf, resp = await _fetch_direct_pdf(plan_number, pdf_cache.conditional_headers(entry))
+        if resp is not None and resp.status_code == 304:
+            pdf_cache.mark_validated(plan_number)
+            return entry["path"]
+        if pdf is not None:
+            return pdf_cache.put_file(plan_number, pdf, **_validators(resp.headers))
+        pdf, validators = await _browser_fetch(plan_number)
+    except Exception as exc:              # degraded upstream: a stale PDF beats none
+        return _serve_stale(entry, f"{type(exc).__name__}: {exc}")
+    return pdf_cache.put_file(plan_number, pdf, **validators)
+
+
+def _serve_stale(entry: dict, why: str) -> Path:
+    global _stale_served
+    _stale_served += 1
+    log.warning("mavat %s: serving stale cached PDF (%s)", entry["plan"], why)
+    return entry["path"]
+
+
+def metrics() -> dict:
+    """Breaker state, step latencies, pool and cache occupancy for /metrics."""
+    return {
+        "breaker": breaker.metrics(),
+        "stale_served": _stale_served,
+        "coalesced": flights.coalesced,
+        "browser_pool": pool.stats(),
+        "pdf_cache": pdf_cache.stats(),
+    }
+
+
+async def download_plan_pdf(plan_number: str) -> bytes:
+    """Drive MaVaT to the plan's instructions document and return the PDF bytes."""
+    return _read_and_remove((await _browser_fetch(plan_number))[0])
+
+
+async def _browser_fetch(plan_number: str) -> tuple[Path, dict]:
+    """The Chromium flow behind the breaker; fails fast with CircuitOpen when open."""
+    breaker.check()
+    timer = StepTimer(f"mavat {plan_number}")
+    try:
+        result = await _browser_flow(plan_number, timer)
+    except PlanUnavailable:               # MaVaT answered; the plan just has no PDF
+        breaker.success(timer.completed())
+        raise
+    except Exception as exc:
+        breaker.failure(exc)
+        raise
+    except BaseException:                 # cancelled: no verdict on MaVaT
+        breaker.abandon()
+        raise
+    breaker.success(timer.completed())
+    return result
+
+
+async def _browser_flow(plan_number: str, timer: StepTimer) -> tuple[Path, dict]:
+    """The Chromium flow; returns (temp file holding the PDF, its validators)."""
+    routes = None
+    try:
+        async with pool.context() as context:
+            routes = await route_policy.install(context)
+            page = await context.new_page()
+            traffic = _Traffic(page)
+            target = MAVAT_URL.format(plan_number=plan_number)
+
+            requests: dict[str, Request] = {}
+            responses: dict[str, Response] = {}
+            page.on("request", lambda req: requests.__setitem__(req.url, req))
+            page.on("response", lambda resp: responses.__setitem__(resp.url, resp))
+
+            with timer.step("goto"):
+                await page.goto(target, wait_until="commit",
+                                timeout=_timeout("goto", NAV_TIMEOUT_MS))
+            with timer.step("render"), traffic.plan_specific(plan_number, "plan page"):
+                await _wait_for_plan_page(page, target, _timeout("render", NAV_TIMEOUT_MS))
+
+            # Open accordion panes; each click auto-waits for its target to be
+            # visible, stable (animation finished) and enabled.  A pane that
+            # never shows up on a healthy page is the plan's, not MaVaT's, fault.
+            with timer.step("open_docs"), traffic.plan_specific(plan_number, "documents pane"):
+                await page.click(SEL_DOCS, timeout=_timeout("open_docs", STEP_TIMEOUT_MS))
+            with timer.step("open_pending"), traffic.plan_specific(plan_number, "pending documents"):
+                await page.click(SEL_PENDING, timeout=_timeout("open_pending", STEP_TIMEOUT_MS))
+            with timer.step("open_rules"), traffic.plan_specific(plan_number, "'הוראות' document"):
+                await page.click(SEL_RULES, timeout=_timeout("open_rules", STEP_TIMEOUT_MS))
+
+            with timer.step("download"):
+                async with page.expect_download(
+                        timeout=_timeout("download", DL_TIMEOUT_MS)) as dl_info:
+                    with traffic.plan_specific(plan_number, "PDF icon"):
+                        await page.click(SEL_PDF_ICON, timeout=STEP_TIMEOUT_MS)
+                download = await dl_info.value
+                path: str | None = await download.path()
+            if not path:
+                raise RuntimeError("Download failed – MaVaT did not return a file.")
+            _record_direct(plan_number, download.url, requests.get(download.url))
+
+            resp = responses.get(download.url)
+            validators = _validators(resp.headers) if resp is not None else {}
+
+            # copy out before the context closes – Playwright deletes its temp
+            # file; a file copy, so the PDF is never held in memory
+            dest = pdf_cache.tmp_file()
+            try:
+                await download.save_as(dest)
+            except BaseException:
+                dest.unlink(missing_ok=True)
+                raise
+            return dest, validators
+    finally:
+        timer.report()
+        if routes is not None:
+            routes.report(timer.label)
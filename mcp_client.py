@@ -0,0 +1,163 @@
+"""
+mcp_client.py
+-------------
+One long-lived MCP client session to the MaVaT server, shared by every tool
+invocation in the process.
+
+    client = get_client()
+    result = await client.call_tool("get_plan_pdf", {"plan_number": "..."})
+    result = client.call_tool_sync("get_plan_pdf", {...})        # AutoGen side
+
+• Transport: streamable-http against `mavat_mcp.py --http` when
+  $MAVAT_MCP_URL is set (e.g. http://host:8080/mcp), otherwise a single
+  `mavat_mcp.py` stdio child kept alive for the life of the process.
+• The session lives on the shared background loop (aio_loop.py), so the
+  interpreter start-up, Playwright import and MCP handshake are paid once.
+• ClientSession multiplexes requests by id: concurrent `call_tool`s share
+  the one connection instead of queueing behind each other.
+• Reconnecting: if the child dies or the HTTP stream breaks, the dead
+  session is torn down and the call is retried once on a fresh one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+import aio_loop
+
+log = logging.getLogger(__name__)
+
+MAVAT_MCP_URL = os.getenv("MAVAT_MCP_URL")
+MCP_CALL_TIMEOUT_S = float(os.getenv("MCP_CALL_TIMEOUT_S", "180"))
+
+# not bare OSError: on 3.11+ that includes TimeoutError, i.e. a merely slow call
+_CONNECTION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError,
+                      anyio.EndOfStream, ConnectionError)
+
+
+class McpClient:
+    """Lazily connected, self-healing MCP client session."""
+
+    def __init__(self, url: str | None = MAVAT_MCP_URL,
+                 server_script: str | Path = Path(__file__).with_name("mavat_mcp.py")):
+        self.url = url
+        self.server_script = str(server_script)
+        self._session: ClientSession | None = None
+        self._stop: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None
+        self.connects = 0
+
+    # ── connection ───────────────────────────────────────────────────────────
+    @asynccontextmanager
+    async def _transport(self):
+        if self.url:
+            from mcp.client.streamable_http import streamablehttp_client
+            async with streamablehttp_client(self.url) as (read, write, _):
+                yield read, write
+        else:
+            # the SDK passes only a minimal env allow-list by default; the child
+            # must see our cache dirs, TTLs, pool and breaker settings
+            server = StdioServerParameters(command=sys.executable, args=[self.server_script],
+                                           env=dict(os.environ), cwd=os.getcwd())
+            async with stdio_client(server) as (read, write):
+                yield read, write
+
+    async def _hold(self, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        """Own transport + session for their whole life (anyio scopes are task-bound)."""
+        try:
+            async with self._transport() as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await stop.wait()
+        except BaseException as exc:
+            if not ready.done():
+                ready.set_exception(exc)
+            elif not isinstance(exc, asyncio.CancelledError):
+                log.warning("MCP session closed with error: %r", exc)
+
+    async def _connect(self) -> ClientSession:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._session is None:
+                ready = asyncio.get_running_loop().create_future()
+                self._stop = asyncio.Event()
+                self._runner = asyncio.create_task(self._hold(ready, self._stop))
+                self._session = await ready
+                self.connects += 1
+                log.info("MCP session #%d up (%s)", self.connects, self.url or "stdio")
+            return self._session
+
+    async def _reset(self, session: ClientSession) -> None:
+        """Tear down `session` if it is still the current one."""
+        async with self._lock:
+            if self._session is not session:
+                return                      # somebody already reconnected
+            self._session = None
+            self._stop.set()
+            runner, self._runner = self._runner, None
+        try:
+            await asyncio.wait_for(runner, 5)
+        except Exception:
+            runner.cancel()
+
+    # ── API ──────────────────────────────────────────────────────────────────
+    async def _request(self, method: str, *args):
+        for attempt in range(2):
+            session = await self._connect()
+            try:
+                return await asyncio.wait_for(getattr(session, method)(*args),
+                                              MCP_CALL_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                raise                       # slow, not broken: keep the shared session
+            except McpError as exc:
+                if exc.error.code != CONNECTION_CLOSED or attempt:
+                    raise
+                log.warning("MCP connection closed, reconnecting")
+                await self._reset(session)
+            except _CONNECTION_ERRORS as exc:
+                if attempt:
+                    raise
+                log.warning("MCP connection lost (%r), reconnecting", exc)
+                await self._reset(session)
+
+    async def call_tool(self, name: str, arguments: dict):
+        return await self._request("call_tool", name, arguments)
+
+    async def read_resource(self, uri: str):
+        return await self._request("read_resource", uri)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._reset(self._session)
+
+    # ── sync facade (AutoGen tools) ──────────────────────────────────────────
+    def call_tool_sync(self, name: str, arguments: dict):
+        return aio_loop.run(self.call_tool(name, arguments))
+
+    def read_resource_sync(self, uri: str):
+        return aio_loop.run(self.read_resource(uri))
+
+
+_client: McpClient | None = None
+
+
+def get_client() -> McpClient:
+    """The process-wide MaVaT MCP client (runs on the aio_loop background loop)."""
+    global _client
+    if _client is None:
+        _client = McpClient()
+    return _client
@@ -0,0 +1,182 @@
+"""
+osm_geocoder.py
+---------------
+Optional offline geocoder built from a local OpenStreetMap extract.
+
+build_index(pbf_path, db_path)  → SQLite street + house-number index
+lookup(parts, db_path)          → (lat, lon) or None, no network involved
+
+Every OSM node / way carrying addr:street + addr:housenumber becomes a row
+(ways are reduced to the centroid of their nodes).  Many Israeli addresses
+have no addr:city, so those rows get the nearest place=city/town/village
+node instead.  Street and city are stored in `normalize_text` form, and
+city aliases go through the address_parser gazetteer, so "Beer Sheva" and
+"באר שבע" hit the same rows.
+
+Build once (needs `pip install osmium`; the Israel extract is at
+https://download.geofabrik.de/asia/israel-and-palestine-latest.osm.pbf):
+    python osm_geocoder.py israel-and-palestine-latest.osm.pbf [osm-geocoder.sqlite]
+
+geocode_parts picks it up automatically when $OSM_GEOCODER_DB exists.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from address_parser import STREET_WORDS, canonical_city, normalize_text
+from plan_index import haversine_np
+
+OSM_GEOCODER_DB = os.getenv("OSM_GEOCODER_DB", "osm-geocoder.sqlite")
+# how far (in house numbers) a nearest-number fallback may be from the request
+OSM_NEAREST_MAX_DELTA = int(os.getenv("OSM_NEAREST_MAX_DELTA", "10"))
+
+PLACE_TYPES = {"city", "town", "village"}
+
+_local = threading.local()
+
+
+def _street_key(street: str) -> str:
+    words = [w for w in normalize_text(street).split() if w not in STREET_WORDS]
+    return " ".join(words)
+
+
+def _city_key(city: str) -> str:
+    return normalize_text(canonical_city(city) or city)
+
+
+# ── Build ────────────────────────────────────────────────────────────────────
+def _collect(pbf_path: str):
+    """Read the extract; returns (address rows, place names, place lat/lon)."""
+    try:
+        import osmium
+    except ImportError as exc:
+        raise ImportError("osm_geocoder.build_index needs `pip install osmium`") from exc
+
+    rows, places, place_ll = [], [], []
+
+    class Handler(osmium.SimpleHandler):
+        def _addr(self, tags, lat, lon):
+            street, number = tags.get("addr:street"), tags.get("addr:housenumber")
+            if street and number:
+                rows.append((street, number, tags.get("addr:city", ""), lat, lon))
+
+        def node(self, n):
+            if not n.location.valid():
+                return
+            if n.tags.get("place") in PLACE_TYPES and "name" in n.tags:
+                places.append(n.tags.get("name:he") or n.tags["name"])
+                place_ll.append((n.location.lat, n.location.lon))
+            self._addr(n.tags, n.location.lat, n.location.lon)
+
+        def way(self, w):
+            if "addr:housenumber" not in w.tags:
+                return
+            pts = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if pts:
+                lat, lon = np.mean(pts, axis=0)
+                self._addr(w.tags, float(lat), float(lon))
+
+    Handler().apply_file(pbf_path, locations=True)
+    return rows, places, np.asarray(place_ll, dtype=np.float64).reshape(-1, 2)
+
+
+def _nearest_places(lat: np.ndarray, lon: np.ndarray, places: list[str],
+                    ll: np.ndarray, block: int = 2048) -> list[str]:
+    """Name of the nearest place node for every (lat, lon), in blocks."""
+    if not places:
+        return [""] * len(lat)
+    p_phi, p_lam = np.radians(ll[:, 0]), np.radians(ll[:, 1])
+    p_cos = np.cos(p_phi)
+    q_phi, q_lam = np.radians(lat), np.radians(lon)
+    out = []
+    for i in range(0, len(lat), block):
+        qp, ql = q_phi[i:i + block, None], q_lam[i:i + block, None]
+        d = haversine_np(qp, ql, np.cos(qp), p_phi, p_lam, p_cos)
+        out.extend(places[j] for j in d.argmin(axis=1))
+    return out
+
+
+def build_index(pbf_path: str, db_path: str = OSM_GEOCODER_DB) -> int:
+    """Build the SQLite address index from `pbf_path`; returns the row count."""
+    rows, places, place_ll = _collect(pbf_path)
+    missing = [k for k, r in enumerate(rows) if not r[2]]
+    if missing:
+        lat = np.array([rows[k][3] for k in missing])
+        lon = np.array([rows[k][4] for k in missing])
+        for k, name in zip(missing, _nearest_places(lat, lon, places, place_ll)):
+            rows[k] = (*rows[k][:2], name, *rows[k][3:])
+
+    tmp = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    db.execute("CREATE TABLE addr (city TEXT, street TEXT, number TEXT,"
+               " num INTEGER, lat REAL, lon REAL)")
+    db.executemany(
+        "INSERT INTO addr VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (_city_key(city),
+             _street_key(street), normalize_text(number),
+             int("".join(ch for ch in number if ch.isdigit())[:6] or -1), lat, lon)
+            for street, number, city, lat, lon in rows
+        ),
+    )
+    db.execute("CREATE INDEX addr_key ON addr (city, street, number)")
+    db.commit()
+    db.close()
+    os.replace(tmp, db_path)
+    return len(rows)
+
+
+# ── Lookup ───────────────────────────────────────────────────────────────────
+def _db(db_path: str) -> sqlite3.Connection | None:
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if db_path not in conns:
+        if not os.path.exists(db_path):
+            return None
+        conns[db_path] = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    return conns[db_path]
+
+
+def lookup(parts: dict, db_path: str = OSM_GEOCODER_DB) -> tuple[float, float] | None:
+    """
+    Exact (city, street, number) match; failing that, the closest house
+    number on the same street within OSM_NEAREST_MAX_DELTA.  None otherwise,
+    so the caller falls through to the cache and the remote geocoders.
+    """
+    db = _db(db_path)
+    if db is None or not parts.get("street") or not parts.get("city"):
+        return None
+    city, street = _city_key(parts["city"]), _street_key(parts["street"])
+    number = normalize_text(str(parts.get("number") or ""))
+
+    row = db.execute(
+        "SELECT lat, lon FROM addr WHERE city = ? AND street = ? AND number = ? LIMIT 1",
+        (city, street, number),
+    ).fetchone()
+    if row is None and number:
+        digits = "".join(ch for ch in number if ch.isdigit())
+        target = int(digits) if digits else 0
+        row = db.execute(
+            "SELECT lat, lon FROM addr WHERE city = ? AND street = ? AND num >= 0"
+            " AND ABS(num - ?) <= ? ORDER BY ABS(num - ?) LIMIT 1",
+            (city, street, target, OSM_NEAREST_MAX_DELTA, target),
+        ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python osm_geocoder.py <EXTRACT.osm.pbf> [DB_PATH]")
+    out = sys.argv[2] if len(sys.argv) == 3 else OSM_GEOCODER_DB
+    n = build_index(sys.argv[1], out)
+    print(f"✅  {n:,} addresses → {out}")
@@ -0,0 +1,215 @@
+"""
+pdf_cache.py
+------------
+Content-addressed on-disk cache of MaVaT plan PDFs, shared by every process.
+
+    entry = pdf_cache.lookup(plan_number)     # → dict or None
+    if entry and pdf_cache.is_fresh(entry):
+        path = entry["path"]
+    else:
+        path = pdf_cache.put(plan_number, pdf_bytes, etag=…, last_modified=…)
+    path = pdf_cache.put_file(plan_number, tmp_path)    # streamed download
+    path = pdf_cache.blob(sha256)                       # by content hash
+
+• Blobs live under CACHE_DIR/pdfs/<sha[:2]>/<sha256>.pdf and are written
+  atomically (tmp file + os.replace), so concurrent writers never clobber
+  each other and identical PDFs are stored once.
+• A SQLite index maps plan → sha, fetch/validation times and the upstream
+  validators (ETag / Last-Modified) used for conditional revalidation.
+• Freshness: plans whose status in city-plans.json is "בתוקף" (approved) keep
+  their PDF for PDF_TTL_APPROVED (a year by default — effectively forever);
+  anything else is revalidated after PDF_TTL.
+• The cache is capped at PDF_CACHE_MAX_MB; least-recently-used blobs go first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from kvcache import CACHE_DIR
+from plan_index import get_index
+
+PDF_CACHE_DIR    = Path(os.getenv("PDF_CACHE_DIR", str(CACHE_DIR / "pdfs")))
+PDF_CACHE_MAX_MB = float(os.getenv("PDF_CACHE_MAX_MB", "2048"))
+PDF_TTL          = float(os.getenv("PDF_TTL", str(7 * 86400)))
+PDF_TTL_APPROVED = float(os.getenv("PDF_TTL_APPROVED", str(365 * 86400)))
+
+APPROVED_STATUS = "בתוקף"
+
+_local = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    db = getattr(_local, "db", None)
+    if db is None:
+        PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(PDF_CACHE_DIR / "index.sqlite", timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " plan TEXT PRIMARY KEY, sha TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " validated_at REAL NOT NULL, etag TEXT, last_modified TEXT)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS blobs_lru ON blobs(last_used)")
+        _local.db = db
+    return db
+
+
+def _blob_path(sha: str) -> Path:
+    return PDF_CACHE_DIR / sha[:2] / f"{sha}.pdf"
+
+
+def blob(sha256: str) -> Path | None:
+    """Path of the cached PDF with this content hash, or None."""
+    path = _blob_path(sha256)
+    return path if len(sha256) == 64 and path.exists() else None
+
+
+def plan_status_approved(plan_number: str) -> bool:
+    """True when city-plans.json lists the plan as approved (בתוקף)."""
+    try:
+        return APPROVED_STATUS in get_index().statuses_of(plan_number)
+    except FileNotFoundError:                 # no local dataset – assume mutable
+        return False
+
+
+# ── API ──────────────────────────────────────────────────────────────────────
+def lookup(plan_number: str) -> dict | None:
+    """Index entry for `plan_number` (with its blob `path`), or None if not cached."""
+    db = _db()
+    row = db.execute(
+        "SELECT sha, fetched_at, validated_at, etag, last_modified FROM plans WHERE plan = ?",
+        (plan_number,),
+    ).fetchone()
+    if row is None:
+        return None
+    path = _blob_path(row[0])
+    if not path.exists():                     # evicted / removed by hand
+        db.execute("DELETE FROM plans WHERE plan = ?", (plan_number,))
+        return None
+    db.execute("UPDATE blobs SET last_used = ? WHERE sha = ?", (time.time(), row[0]))
+    return {
+        "plan": plan_number, "sha256": row[0], "path": path, "size": path.stat().st_size,
+        "fetched_at": row[1], "validated_at": row[2],
+        "etag": row[3], "last_modified": row[4],
+    }
+
+
+def is_fresh(entry: dict) -> bool:
+    """Whether `entry` may be served without asking upstream."""
+    ttl = PDF_TTL_APPROVED if plan_status_approved(entry["plan"]) else PDF_TTL
+    return time.time() - entry["validated_at"] < ttl
+
+
+def conditional_headers(entry: dict) -> dict:
+    """If-None-Match / If-Modified-Since for revalidating `entry`."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def mark_validated(plan_number: str) -> None:
+    """Upstream answered 304 Not Modified: restart the entry's freshness clock."""
+    _db().execute("UPDATE plans SET validated_at = ? WHERE plan = ?",
+                  (time.time(), plan_number))
+
+
+def put(plan_number: str, data: bytes, etag: str | None = None,
+        last_modified: str | None = None) -> Path:
+    """Store `data` as the current PDF of `plan_number`; returns the blob path."""
+    sha = hashlib.sha256(data).hexdigest()
+    path = _blob_path(sha)
+    if not path.exists():
+        tmp = _tmp_path(path)
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    _index(plan_number, sha, len(data), etag, last_modified)
+    return path
+
+
+def put_file(plan_number: str, src: str | Path, etag: str | None = None,
+             last_modified: str | None = None, chunk_size: int = 1 << 20) -> Path:
+    """Like `put`, but moves an already-written file in (hashed in chunks)."""
+    src = Path(src)
+    h = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    sha = h.hexdigest()
+    path = _blob_path(sha)
+    size = src.stat().st_size
+    if path.exists():
+        src.unlink()
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, path)             # same filesystem when src came from tmp_file()
+    _index(plan_number, sha, size, etag, last_modified)
+    return path
+
+
+def tmp_file() -> Path:
+    """A fresh temp path inside the cache, for streaming a download into."""
+    return _tmp_path(PDF_CACHE_DIR / "incoming" / "download.pdf")
+
+
+def _tmp_path(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.tmp")
+
+
+def _index(plan_number: str, sha: str, size: int, etag: str | None,
+           last_modified: str | None) -> None:
+    now = time.time()
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        prev = db.execute("SELECT sha, etag, last_modified FROM plans WHERE plan = ?",
+                          (plan_number,)).fetchone()
+        if prev and prev[0] == sha and not (etag or last_modified):
+            etag, last_modified = prev[1], prev[2]      # same bytes: keep validators
+        db.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?)",
+                   (plan_number, sha, now, now, etag, last_modified))
+        db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (sha, size, now))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    _evict(keep=sha)
+
+
+def _evict(keep: str) -> None:
+    """Drop least-recently-used blobs (and their plan rows) above the size cap."""
+    db = _db()
+    limit = int(PDF_CACHE_MAX_MB * 1024 * 1024)
+    total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    if total <= limit:
+        return
+    for sha, size in db.execute(
+        "SELECT sha, size FROM blobs WHERE sha != ? ORDER BY last_used", (keep,)
+    ).fetchall():
+        db.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+        db.execute("DELETE FROM plans WHERE sha = ?", (sha,))
+        _blob_path(sha).unlink(missing_ok=True)
+        total -= size
+        if total <= limit:
+            break
+
+
+def stats() -> dict:
+    db = _db()
+    plans = db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+    blobs, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+    return {"plans": plans, "blobs": blobs, "bytes": size,
+            "max_bytes": int(PDF_CACHE_MAX_MB * 1024 * 1024)}
@@ -4,65 +4,106 @@ pdf_tools.py  –  fixed
 
 plan_to_json(plan_number) → dict with Table-5 JSON.
 
-• Spawns mavat_mcp.py over stdio on each call (fast: the PDF download dominates)
-• Calls the MCP tool get_plan_pdf via mcp.client.stdio
-• Saves the PDF, extracts Table-5, asks GPT-4o to turn TSV → JSON
+• Talks to mavat_mcp.py over one persistent, reconnecting MCP session
+  (mcp_client.py: stdio child, or streamable-http when $MAVAT_MCP_URL is set)
+• Calls the MCP tool get_plan_pdf; it returns an
+  artifact handle (path / uri / sha256 / size).  Same host → the server's
+  cache file is used as-is; otherwise the blob resource is streamed to disk
+  chunk by chunk (no base-64 copy of the whole PDF in memory)
+• Keeps the PDF in the shared on-disk cache (pdf_cache.py) – a fresh copy
+  skips the MCP round-trip entirely, and nothing is written to the cwd
+• Extracts Table-5 (page / grid / TSV cached per PDF hash), asks GPT-4o to
+  turn TSV → JSON
+• Concurrent calls for the same plan share one download + extraction
+  (singleflight.py, also across worker processes)
 """
 
-import asyncio
 import base64
+import hashlib
+import json
 from pathlib import Path
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-
+import aio_loop
+import pdf_cache
+from mcp_client import McpClient, get_client
+from singleflight import SingleFlight
 from extract_table5 import (
-    find_table5_page,
-    extract_widest_table,
-    table_to_tsv,
+    table5_artifacts,
     tsv_to_json_via_chat,
 )
 
 
-# ---------------------------------------------------------------------------
-# Helper: download PDF bytes (base-64 string) from the MCP server
-# ---------------------------------------------------------------------------
-async def _get_plan_pdf_b64_async(plan_number: str) -> str:
-    """Call the MCP server’s get_plan_pdf tool and return its base-64 bytes."""
-    server = StdioServerParameters(command="python", args=["mavat_mcp.py"])
-
-    async with stdio_client(server) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
-            result = await session.call_tool(
-                "get_plan_pdf", {"plan_number": plan_number}
-            )
-
-    # result.content[0].text holds the base-64 PDF string
-    return result.content[0].text
+_flights = SingleFlight("plan_to_json")
 
 
-def _download_pdf_b64(plan_number: str) -> str:
-    """Sync wrapper around the async download helper."""
-    return asyncio.run(_get_plan_pdf_b64_async(plan_number))
+# ---------------------------------------------------------------------------
+# Helper: fetch the PDF behind a get_plan_pdf artifact handle
+# ---------------------------------------------------------------------------
+async def fetch_pdf_handle(client: McpClient, handle: dict) -> Path:
+    """Local cache path for `handle`; streams the chunks over MCP if needed."""
+    local = pdf_cache.blob(handle["sha256"])
+    if local is not None:
+        return local                        # shared cache on this host
+    path = Path(handle["path"])
+    if path.is_file() and path.stat().st_size == handle["size"]:
+        return path                         # server's own cache, same host
+
+    tmp = pdf_cache.tmp_file()
+    try:
+        h = hashlib.sha256()
+        with open(tmp, "wb") as f:
+            for chunk in range(handle["chunks"]):
+                res = await client.read_resource(f"{handle['uri']}/{chunk}")
+                data = base64.b64decode(res.contents[0].blob)
+                h.update(data)
+                f.write(data)
+        # verify before indexing: a corrupt download must never become "fresh"
+        if h.hexdigest() != handle["sha256"]:
+            raise RuntimeError(f"PDF for {handle['plan_number']} failed its sha256 check")
+        return pdf_cache.put_file(handle["plan_number"], tmp)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def _get_plan_pdf_async(plan_number: str) -> Path:
+    """Call the MCP server’s get_plan_pdf tool and return the local PDF path."""
+    client = get_client()
+    result = await client.call_tool("get_plan_pdf", {"plan_number": plan_number})
+    if result.isError:
+        raise RuntimeError(result.content[0].text if result.content else "get_plan_pdf failed")
+    # result.content[0].text holds the JSON artifact handle
+    return await fetch_pdf_handle(client, json.loads(result.content[0].text))
+
+
+def _download_pdf(plan_number: str) -> str:
+    """Sync wrapper (shared background loop); returns the PDF path."""
+    return str(aio_loop.run(_get_plan_pdf_async(plan_number)))
 
 
 # ---------------------------------------------------------------------------
 # High-level tool exposed to AutoGen
 # ---------------------------------------------------------------------------
+def _plan_pdf_path(plan_number: str) -> Path:
+    """Cached PDF for `plan_number`; downloads through the MCP server if stale."""
+    entry = pdf_cache.lookup(plan_number)
+    if entry is not None and pdf_cache.is_fresh(entry):
+        return entry["path"]
+    return Path(_download_pdf(plan_number))
+
+
 def plan_to_json(plan_number: str) -> dict:
     """
     Download the MaVaT PDF for `plan_number` and return Table-5 JSON.
     """
-    # 1) download & save PDF
-    pdf_b64 = _download_pdf_b64(plan_number)
-    pdf_path = Path(f"{plan_number}.pdf").resolve()
-    pdf_path.write_bytes(base64.b64decode(pdf_b64))
+    return _flights.run_sync(plan_number, lambda: _plan_to_json(plan_number))
+
+
+def _plan_to_json(plan_number: str) -> dict:
+    # 1) cached PDF (downloaded only when missing or stale)
+    pdf_path = _plan_pdf_path(plan_number)
 
-    # 2) extract Table-5 TSV
-    page = find_table5_page(pdf_path)
-    table = extract_widest_table(page)
-    tsv = table_to_tsv(table)
+    # 2) extract Table-5 TSV (cached per PDF hash: a hit skips PDF parsing)
+    tsv = table5_artifacts(pdf_path, vision_fallback=False)["tsv"]
 
     # 3) GPT-4o: TSV → JSON
     return tsv_to_json_via_chat(tsv)
@@ -73,5 +114,5 @@ def plan_to_json(plan_number: str) -> dict:
 # ---------------------------------------------------------------------------
 TOOL_MAP = {
     "plan_to_json": plan_to_json,
-    "get_plan_pdf": _download_pdf_b64,   # optional: raw download tool
+    "get_plan_pdf": _download_pdf,       # optional: raw download tool (→ path)
 }
@@ -0,0 +1,459 @@
+"""
+plan_index.py
+-------------
+Process-resident spatial index over the city-plans dataset.
+
+get_index()                               → PlanIndex (built once per process)
+PlanIndex.within(lat, lon, r_km)          → plan hits inside a radius, nearest first
+PlanIndex.nearest(lat, lon, k)            → the k nearest plan hits
+PlanIndex.within_many(lats, lons, r_km)   → radius hits for a whole batch of points
+group_by_plan(hits)                       → one entry per core plan (sub-plans merged)
+PlanIndex.statuses_of(plan)               → statuses recorded for a plan id
+build_columns(json_path, out_path)        → ingest city-plans.json into a .cols file
+
+Records are kept as columnar NumPy arrays (radians pre-computed), sorted by a
+grid-cell key (CELL_DEG degrees per side, row-major).  A single grid row is
+therefore a contiguous slice found with `searchsorted`, so a query only runs
+the vectorised haversine over the cells that overlap its bounding box — the
+cost stays flat as the dataset grows from one city to the whole country.
+
+The columns live in a single binary file (`city-plans.cols`) that every
+process memory-maps read-only, so workers share the same pages and nobody
+re-parses the JSON.  Layout:
+
+    b"PLANCOL1" | u64 header length | JSON header | 64-byte aligned columns
+
+The header lists each column's dtype/offset, the interned status strings and
+the size/mtime of the source JSON (a changed source triggers a rebuild).
+Plan ids are stored already normalised to their 605-0543108 core.
+
+Several records often share one core plan (605-0543108(21), 605-0543108(22),
+…).  Queries group them by default so each core plan — and therefore each
+MaVaT PDF download downstream — appears exactly once.
+
+Usage:
+    python plan_index.py [city-plans.json] [city-plans.cols]
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import struct
+import sys
+import threading
+
+import numpy as np
+
+EARTH_R_KM = 6371.0
+KM_PER_DEG = math.pi * EARTH_R_KM / 180     # ~111.2 km per degree of latitude
+CELL_DEG   = 0.01                           # ~1.1 km grid cells
+_ROW_W     = 1 << 20                        # key = row * _ROW_W + col (cols fit 20 bits)
+_BATCH_EL  = 2_000_000                      # max point×record cells per batch block
+
+PLAN_RE = re.compile(r"^(\d{3}-\d{7})(?:\(\d+\))?$")  # core id, optional "(…)"
+
+LOCAL_JSON = os.getenv("CITY_PLANS_JSON", "city-plans.json")
+COLS_PATH  = os.getenv("CITY_PLANS_COLS", "city-plans.cols")
+
+_MAGIC = b"PLANCOL1"
+_ALIGN = 64
+_FORMAT = 2             # bump when _records_to_columns changes what it keeps
+
+
+def _row(lat):
+    return np.floor(np.asarray(lat, dtype=np.float64) / CELL_DEG).astype(np.int64)
+
+
+def _col(lon):
+    return np.floor((np.asarray(lon, dtype=np.float64) + 180) / CELL_DEG).astype(np.int64)
+
+
+def haversine_np(phi1, lam1, cos1, phi2, lam2, cos2):
+    """Vectorised haversine (km) on radians / cos(lat); arguments broadcast."""
+    a = np.sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * np.sin((lam2 - lam1) / 2) ** 2
+    return 2 * EARTH_R_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# ── Ingestion: JSON records → columns → .cols file ──────────────────────────
+def _finite(value) -> bool:
+    try:
+        return math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _records_to_columns(items: list[dict]) -> tuple[dict[str, np.ndarray], list[str]]:
+    """Normalise plan ids, intern statuses and sort every column by grid key."""
+    kept = []
+    for item in items:
+        m = PLAN_RE.match(item["Plan"].strip())
+        if m and _finite(item.get("lat")) and _finite(item.get("lon")):
+            kept.append((m.group(1), item))     # no coordinates: can never match a query
+
+    codes: dict[str, int] = {}
+    for _, item in kept:
+        codes.setdefault(item.get("status", ""), len(codes))
+    statuses = list(codes)
+
+    def _s(values):
+        return np.array([v.encode("utf-8") for v in values] or [b""], dtype="S")[:len(values)]
+
+    def _f(key):
+        return np.array([float(item.get(key) or "nan") for _, item in kept], dtype=np.float64)
+
+    lat, lon = _f("lat"), _f("lon")
+    cols = {
+        "lat":        lat,
+        "lon":        lon,
+        "plan":       _s([core for core, _ in kept]),
+        "plan_raw":   _s([item["Plan"].strip() for _, item in kept]),
+        "status":     np.array([codes[item.get("status", "")] for _, item in kept],
+                               dtype=np.uint16),
+        "taba":       _s([item.get("Taba_Numer", "") for _, item in kept]),
+        "link":       _s([item.get("OutSide_li", "") for _, item in kept]),
+        "shape_leng": _f("SHAPE_Leng"),
+        "shape_area": _f("SHAPE_Area"),
+    }
+    key = _row(lat) * _ROW_W + _col(lon)
+    order = np.argsort(key, kind="stable")
+    cols = {name: arr[order] for name, arr in cols.items()}
+    cols["key"] = key[order]
+    cols["phi"] = np.radians(cols["lat"])
+    cols["lam"] = np.radians(cols["lon"])
+    cols["cos"] = np.cos(cols["phi"])
+    return cols, statuses
+
+
+def _load_json(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found – download it once from:\n"
+            "https://data.gov.il/dataset/city-plans-br7/resource/"
+            "183c23ae-13f4-47f9-b756-184547777e00/download/city-plans.json"
+        )
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _source_stamp(json_path: str) -> dict:
+    st = os.stat(json_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def build_columns(json_path: str = LOCAL_JSON, out_path: str = COLS_PATH) -> str:
+    """Convert `json_path` into the memory-mappable columnar file at `out_path`."""
+    cols, statuses = _records_to_columns(_load_json(json_path))
+    n = len(cols["key"])
+
+    layout, offset = {}, 0
+    for name, arr in cols.items():
+        layout[name] = {"dtype": arr.dtype.str, "offset": offset}
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({
+        "count":    n,
+        "cell_deg": CELL_DEG,
+        "format":   _FORMAT,
+        "statuses": statuses,
+        "source":   _source_stamp(json_path),
+        "columns":  layout,
+    }, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, arr in cols.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, out_path)          # atomic: readers never see a half file
+    return out_path
+
+
+def _read_header(path: str) -> tuple[dict, int]:
+    with open(path, "rb") as f:
+        head = f.read(len(_MAGIC) + 8)
+        if head[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"{path} is not a plan columns file")
+        (hlen,) = struct.unpack("<Q", head[len(_MAGIC):])
+        if hlen > os.fstat(f.fileno()).st_size - len(head):
+            raise ValueError(f"{path} has a corrupt header length")
+        header = json.loads(f.read(hlen).decode("utf-8"))
+    return header, -(-(len(_MAGIC) + 8 + hlen) // _ALIGN) * _ALIGN
+
+
+def _columns_fresh(cols_path: str, json_path: str) -> bool:
+    """True if `cols_path` exists and was built from the current `json_path`."""
+    if not os.path.exists(cols_path):
+        return False
+    if not os.path.exists(json_path):
+        return True                     # shipped without the source: trust it
+    try:
+        header, _ = _read_header(cols_path)
+    except (OSError, ValueError):
+        return False
+    return (header.get("source") == _source_stamp(json_path)
+            and header.get("cell_deg") == CELL_DEG
+            and header.get("format") == _FORMAT)
+
+
+def group_by_plan(hits: list[dict]) -> list[dict]:
+    """
+    Collapse record hits (nearest first) into one entry per core plan.
+
+    The entry keeps the nearest record's fields and adds `statuses`,
+    `Taba_Numers`, the summed `SHAPE_Area` of the matched records and the
+    records themselves under `sub_plans` (with their original plan ids).
+    """
+    groups: dict[str, dict] = {}
+    for h in hits:
+        sub = {**h, "Plan": h["Plan_raw"]}
+        del sub["Plan_raw"]
+        g = groups.get(h["Plan"])
+        if g is None:
+            g = groups[h["Plan"]] = {
+                "Plan":        h["Plan"],
+                "status":      h["status"],
+                "statuses":    [],
+                "Taba_Numer":  h["Taba_Numer"],
+                "Taba_Numers": [],
+                "OutSide_li":  h["OutSide_li"],
+                "SHAPE_Area":  0.0,
+                "lat":         h["lat"],
+                "lon":         h["lon"],
+                "distance_km": h["distance_km"],
+                "sub_plans":   [],
+            }
+        if h["status"] not in g["statuses"]:
+            g["statuses"].append(h["status"])
+        if h["Taba_Numer"] not in g["Taba_Numers"]:
+            g["Taba_Numers"].append(h["Taba_Numer"])
+        if not math.isnan(h["SHAPE_Area"]):
+            g["SHAPE_Area"] += h["SHAPE_Area"]
+        g["sub_plans"].append(sub)
+    return list(groups.values())
+
+
+class PlanIndex:
+    """Grid-sorted columnar plan records with radius, k-nearest and batch queries."""
+
+    def __init__(self, cols: dict[str, np.ndarray], statuses: list[str]):
+        self._statuses = statuses
+        self._key  = cols["key"]
+        self.lat   = cols["lat"]
+        self.lon   = cols["lon"]
+        self._phi  = cols["phi"]
+        self._lam  = cols["lam"]
+        self._cos  = cols["cos"]
+        self._plan = cols["plan"]
+        self._plan_raw = cols["plan_raw"]
+        self._status = cols["status"]
+        self._taba = cols["taba"]
+        self._link = cols["link"]
+        self._shape_leng = cols["shape_leng"]
+        self._shape_area = cols["shape_area"]
+
+    @classmethod
+    def from_json(cls, path: str = LOCAL_JSON) -> "PlanIndex":
+        """Build an in-memory index straight from the JSON (no .cols file)."""
+        return cls(*_records_to_columns(_load_json(path)))
+
+    @classmethod
+    def open(cls, path: str = COLS_PATH) -> "PlanIndex":
+        """Memory-map a .cols file; columns are read-only views on shared pages."""
+        header, data_start = _read_header(path)
+        mm = np.memmap(path, dtype=np.uint8, mode="r")
+        n = header["count"]
+        cols = {}
+        for name, spec in header["columns"].items():
+            dt = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            cols[name] = mm[start:start + n * dt.itemsize].view(dt)
+        return cls(cols, header["statuses"])
+
+    def __len__(self) -> int:
+        return len(self._key)
+
+    def plan_count(self) -> int:
+        """Number of distinct core plans."""
+        if not hasattr(self, "_n_plans"):
+            self._n_plans = len(np.unique(self._plan))
+        return self._n_plans
+
+    def statuses_of(self, plan: str) -> list[str]:
+        """Distinct statuses recorded for `plan` (any sub-plan of its core id)."""
+        m = PLAN_RE.match(plan.strip())
+        core = m.group(1) if m else plan.strip()
+        codes = np.unique(self._status[self._plan == core.encode("utf-8")])
+        return [self._statuses[c] for c in codes]
+
+    # ── internals ────────────────────────────────────────────────────────────
+    @staticmethod
+    def _box(lat_lo, lat_hi, radius_km: float):
+        """Grid row/col span covering [lat_lo, lat_hi] padded by radius_km."""
+        dlat = radius_km / KM_PER_DEG
+        worst = max(abs(lat_lo), abs(lat_hi)) + dlat
+        dlon = dlat / max(math.cos(math.radians(min(worst, 89.9))), 1e-6)
+        return int(_row(lat_lo - dlat)), int(_row(lat_hi + dlat)), dlon
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Record positions in every cell overlapping the query's bounding box."""
+        r0, r1, dlon = self._box(lat, lat, radius_km)
+        c0, c1 = int(_col(lon - dlon)), int(_col(lon + dlon))
+        rows = np.arange(r0, r1 + 1, dtype=np.int64) * _ROW_W
+        lo = np.searchsorted(self._key, rows + c0, side="left")
+        hi = np.searchsorted(self._key, rows + c1, side="right")
+        spans = [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def _band(self, lats: np.ndarray, lons: np.ndarray, radius_km: float) -> np.ndarray:
+        """Record positions in the grid rows / lon range spanned by a block of points."""
+        r0, r1, dlon = self._box(lats.min(), lats.max(), radius_km)
+        lo = int(np.searchsorted(self._key, r0 * _ROW_W, side="left"))
+        hi = int(np.searchsorted(self._key, (r1 + 1) * _ROW_W, side="left"))
+        lon = self.lon[lo:hi]
+        return lo + np.flatnonzero((lon >= lons.min() - dlon) & (lon <= lons.max() + dlon))
+
+    def _distances(self, lat: float, lon: float, idx: np.ndarray) -> np.ndarray:
+        phi = math.radians(lat)
+        return haversine_np(phi, math.radians(lon), math.cos(phi),
+                            self._phi[idx], self._lam[idx], self._cos[idx])
+
+    def _hit(self, dist: float, idx: int) -> dict:
+        return {
+            "Plan":        self._plan[idx].decode("utf-8"),   # 605-0543108 core
+            "Plan_raw":    self._plan_raw[idx].decode("utf-8"),
+            "status":      self._statuses[self._status[idx]],
+            "Taba_Numer":  self._taba[idx].decode("utf-8"),
+            "OutSide_li":  self._link[idx].decode("utf-8"),
+            "SHAPE_Leng":  float(self._shape_leng[idx]),
+            "SHAPE_Area":  float(self._shape_area[idx]),
+            "lat":         float(self.lat[idx]),
+            "lon":         float(self.lon[idx]),
+            "distance_km": round(float(dist), 4),
+        }
+
+    # ── queries ──────────────────────────────────────────────────────────────
+    def within(self, lat: float, lon: float, radius_km: float = 0.1,
+               group: bool = True) -> list[dict]:
+        """Plans within `radius_km` of (lat, lon), nearest first (see group_by_plan)."""
+        idx = self._candidates(lat, lon, radius_km)
+        dist = self._distances(lat, lon, idx)
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        hits = [self._hit(dist[o], idx[o]) for o in order]
+        return group_by_plan(hits) if group else hits
+
+    def _kth_bound(self, lat: float, lon: float, idx: np.ndarray, k: int,
+                   group: bool) -> float:
+        """Distance of the k-th nearest record (or core plan) among `idx`."""
+        dist = self._distances(lat, lon, idx)
+        if group:
+            cores, inv = np.unique(self._plan[idx], return_inverse=True)
+            best = np.full(len(cores), np.inf)
+            np.minimum.at(best, inv, dist)
+            dist = best
+        return float(np.partition(dist, k - 1)[k - 1])
+
+    def nearest(self, lat: float, lon: float, k: int = 5,
+                group: bool = True) -> list[dict]:
+        """The `k` plans (or raw records if group=False) closest to (lat, lon)."""
+        if k <= 0 or not len(self):
+            return []
+        k = min(k, self.plan_count() if group else len(self))
+
+        def enough(idx):
+            return len(np.unique(self._plan[idx]) if group else idx) >= k
+
+        # grow the search box until it holds k candidates …
+        r = CELL_DEG * KM_PER_DEG
+        idx = self._candidates(lat, lon, r)
+        while not enough(idx):
+            r *= 2
+            idx = self._candidates(lat, lon, r)
+        # … then the k-th candidate distance bounds the exact answer.
+        bound = self._kth_bound(lat, lon, idx, k, group)
+        hits = self.within(lat, lon, bound + 1e-9, group=group)
+        return hits[:k]
+
+    def within_many(self, lats, lons, radius_km: float = 0.1,
+                    group: bool = True) -> list[list[dict]]:
+        """
+        Radius query for a batch of points in one vectorised pass.
+
+        Points are sorted by latitude and processed in blocks; each block is
+        matched against the contiguous grid-row slice its latitude band spans
+        (pre-filtered on longitude), as a single broadcast haversine matrix.
+        Returns one hit list per input point, in input order, nearest first.
+        """
+        lats = np.asarray(lats, dtype=np.float64).ravel()
+        lons = np.asarray(lons, dtype=np.float64).ravel()
+        if lats.shape != lons.shape:
+            raise ValueError("lats and lons must have the same length")
+        out: list[list[dict]] = [[] for _ in range(len(lats))]
+        if not len(lats) or not len(self):
+            return out
+
+        q_order = np.argsort(lats, kind="stable")
+        q_phi = np.radians(lats)
+        q_lam = np.radians(lons)
+        q_cos = np.cos(q_phi)
+
+        start, step = 0, 64
+        while start < len(q_order):
+            blk = q_order[start:start + step]
+            rec = self._band(lats[blk], lons[blk], radius_km)
+            if len(blk) > 1 and len(blk) * len(rec) > _BATCH_EL:
+                step = max(1, len(blk) // 2)        # dense band: shrink the block
+                continue
+
+            if len(rec):
+                dist = haversine_np(q_phi[blk, None], q_lam[blk, None], q_cos[blk, None],
+                                    self._phi[rec], self._lam[rec], self._cos[rec])
+                qi, ri = np.nonzero(dist <= radius_km)
+                d = dist[qi, ri]
+                for o in np.lexsort((d, qi)):
+                    out[blk[qi[o]]].append(self._hit(d[o], rec[ri[o]]))
+            start += len(blk)
+            step = min(step * 2, 4096)
+        return [group_by_plan(hits) for hits in out] if group else out
+
+
+# ── Process-wide singleton ──────────────────────────────────────────────────
+_INDEX: PlanIndex | None = None
+_LOCK = threading.Lock()
+
+
+def get_index() -> PlanIndex:
+    """
+    Return the resident PlanIndex.
+
+    The first call in a process (re)builds COLS_PATH if it is missing or older
+    than LOCAL_JSON, then memory-maps it; if the file cannot be written
+    (permissions, read-only filesystem) or read back (truncated/corrupt), we
+    fall back to an in-memory index parsed from the JSON.
+    """
+    global _INDEX
+    if _INDEX is None:
+        with _LOCK:
+            if _INDEX is None:
+                try:
+                    if not _columns_fresh(COLS_PATH, LOCAL_JSON):
+                        build_columns(LOCAL_JSON, COLS_PATH)
+                    _INDEX = PlanIndex.open(COLS_PATH)
+                except (OSError, ValueError, struct.error):
+                    _INDEX = PlanIndex.from_json(LOCAL_JSON)
+    return _INDEX
+
+
+# ── CLI: ingestion step ──────────────────────────────────────────────────────
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else LOCAL_JSON
+    dst = sys.argv[2] if len(sys.argv) > 2 else COLS_PATH
+    build_columns(src, dst)
+    print(f"✅  {len(PlanIndex.open(dst)):,} plan records → {dst} "
+          f"({os.path.getsize(dst):,} bytes)")
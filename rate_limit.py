@@ -0,0 +1,107 @@
+"""
+rate_limit.py
+-------------
+Cross-process request scheduler for rate-limited upstreams (Nominatim, …).
+
+    nominatim = RateLimiter("nominatim", rate=1.0)     # 1 req/s, burst 1
+    await nominatim.acquire()                          # waits for our slot
+    r = await client.get(...)
+    if r.status_code == 429:
+        await nominatim.backoff(parse_retry_after(r.headers.get("Retry-After")))
+
+Each provider's schedule is a GCRA "theoretical arrival time" kept in one
+SQLite row (CACHE_DIR/ratelimit.sqlite), so every worker process shares the
+same budget.  `acquire()` reserves the next free slot in a short transaction
+and then *awaits* it with asyncio.sleep — callers queue in reservation order
+without tying up a thread.  A 429 pushes the provider's schedule past the
+Retry-After horizon for everybody.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import sqlite3
+import threading
+import time
+
+from kvcache import CACHE_DIR
+
+
+class RateLimited(RuntimeError):
+    """The provider's queue is longer than the caller is willing to wait."""
+
+
+def parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    """Per-provider token budget shared by all processes on this host."""
+
+    def __init__(self, name: str, rate: float, burst: int = 1, max_wait: float = 30.0):
+        self.name = name
+        self.interval = 1.0 / rate                     # T   (seconds per request)
+        self.tolerance = (burst - 1) * self.interval   # tau (burst allowance)
+        self.max_wait = max_wait
+        self.path = CACHE_DIR / "ratelimit.sqlite"
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS gcra (name TEXT PRIMARY KEY, tat REAL NOT NULL)")
+            self._local.db = db
+        return db
+
+    def _update(self, fn) -> float:
+        """Atomically read/modify the provider's TAT; `fn(tat, now)` → (new_tat, wait)."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tat FROM gcra WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            new_tat, wait = fn(row[0] if row else now, now)
+            if new_tat is not None:
+                db.execute("INSERT OR REPLACE INTO gcra (name, tat) VALUES (?, ?)",
+                           (self.name, new_tat))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return wait
+
+    def _reserve(self) -> float:
+        def fn(tat, now):
+            send_at = max(now, tat - self.tolerance)
+            if send_at - now > self.max_wait:
+                return None, send_at - now              # don't join the queue
+            return max(tat, send_at) + self.interval, send_at - now
+        return self._update(fn)
+
+    async def acquire(self) -> None:
+        """Reserve the next slot for this provider and wait for it."""
+        wait = await asyncio.to_thread(self._reserve)
+        if wait > self.max_wait:
+            raise RateLimited(f"{self.name}: next slot in {wait:.1f}s")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def backoff(self, seconds: float) -> None:
+        """Upstream said 429: nobody may call it again for `seconds`."""
+        def fn(tat, now):
+            return max(tat, now + seconds + self.tolerance), 0.0
+        await asyncio.to_thread(self._update, fn)
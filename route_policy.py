@@ -0,0 +1,157 @@
+"""
+route_policy.py
+---------------
+Request-interception policy for the MaVaT browser contexts.
+
+    policy = RoutePolicy.from_env()
+    stats = await policy.install(context)      # before the first page.goto
+    ...
+    stats.report("mavat 101-0123456")
+
+The scraper only needs the SPA's HTML, scripts, styles and XHR to click
+three accordions and a PDF icon, so by default:
+
+• image requests are answered locally with a 1×1 GIF (img elements keep
+  their box, so the PDF icon stays clickable; map tiles never leave),
+• font and media requests are aborted,
+• analytics / tag-manager hosts (BLOCK_HOSTS) are aborted,
+• with $MAVAT_FIRST_PARTY set (comma-separated host suffixes, e.g.
+  "iplan.gov.il"), every other host is aborted too.
+
+Stylesheets are kept unless listed in $MAVAT_BLOCK_TYPES: the accordions'
+visibility depends on UIkit's CSS.
+
+Measurement mode ($MAVAT_ROUTE_MEASURE=1) blocks nothing; it logs, per page
+load, how many requests the policy *would* have blocked and their bytes and
+transfer time — i.e. what blocking saves.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import Counter
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Request, Route
+
+log = logging.getLogger(__name__)
+
+BLOCK_TYPES = ("image", "media", "font")
+BLOCK_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "googlesyndication.com", "facebook.net", "facebook.com", "hotjar.com",
+    "clarity.ms", "newrelic.com", "nr-data.net",
+)
+
+# smallest valid transparent GIF
+_GIF_1PX = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01"
+            b"\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
+
+def _env_list(name: str, default: tuple[str, ...]) -> tuple[str, ...]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return tuple(v.strip().lower() for v in value.split(",") if v.strip())
+
+
+def _host_matches(host: str, suffixes: tuple[str, ...]) -> bool:
+    return any(host == s or host.endswith("." + s) for s in suffixes)
+
+
+class RouteStats:
+    """What the policy blocked (or would have blocked) on one context."""
+
+    def __init__(self, measuring: bool):
+        self.measuring = measuring
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+        self.ms = 0.0
+        self.by_reason: Counter = Counter()
+
+    def report(self, label: str) -> None:
+        if self.measuring:
+            log.info("%s: would block %d/%d requests, %.0f KiB, %.0f ms transfer %s",
+                     label, self.blocked, self.requests, self.bytes / 1024, self.ms,
+                     dict(self.by_reason))
+        else:
+            log.info("%s: blocked %d/%d requests %s",
+                     label, self.blocked, self.requests, dict(self.by_reason))
+
+
+class RoutePolicy:
+    """Which requests a MaVaT page load may skip, and how to skip them."""
+
+    def __init__(self, block_types: tuple[str, ...] = BLOCK_TYPES,
+                 block_hosts: tuple[str, ...] = BLOCK_HOSTS,
+                 first_party: tuple[str, ...] = (),
+                 stub_images: bool = True, measure: bool = False):
+        self.block_types = set(block_types)
+        self.block_hosts = block_hosts
+        self.first_party = first_party
+        self.stub_images = stub_images
+        self.measure = measure
+
+    @classmethod
+    def from_env(cls) -> "RoutePolicy":
+        return cls(
+            block_types=_env_list("MAVAT_BLOCK_TYPES", BLOCK_TYPES),
+            block_hosts=_env_list("MAVAT_BLOCK_HOSTS", BLOCK_HOSTS),
+            first_party=_env_list("MAVAT_FIRST_PARTY", ()),
+            measure=os.getenv("MAVAT_ROUTE_MEASURE", "") not in ("", "0"),
+        )
+
+    def reason(self, request: Request) -> str | None:
+        """Why `request` should be skipped ("type:image", "host:…"), or None."""
+        if request.is_navigation_request():
+            return None                     # documents + the PDF download itself
+        host = (urlsplit(request.url).hostname or "").lower()
+        if host and _host_matches(host, self.block_hosts):
+            return "tracker"
+        if host and self.first_party and not _host_matches(host, self.first_party):
+            return "third-party"
+        if request.resource_type in self.block_types:
+            return request.resource_type
+        return None
+
+    async def install(self, context: BrowserContext) -> RouteStats:
+        stats = RouteStats(self.measure)
+
+        if self.measure:
+            async def on_finished(request: Request) -> None:
+                stats.requests += 1
+                why = self.reason(request)
+                if why is None:
+                    return
+                stats.blocked += 1
+                stats.by_reason[why] += 1
+                try:
+                    sizes = await request.sizes()
+                    stats.bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+                except Exception:               # response already gone
+                    pass
+                timing = request.timing
+                if timing.get("responseEnd", -1) > 0:
+                    stats.ms += timing["responseEnd"]
+
+            context.on("requestfinished", on_finished)
+            return stats
+
+        async def handle(route: Route) -> None:
+            request = route.request
+            stats.requests += 1
+            why = self.reason(request)
+            if why is None:
+                await route.continue_()
+                return
+            stats.blocked += 1
+            stats.by_reason[why] += 1
+            if why == "image" and self.stub_images:
+                await route.fulfill(status=200, content_type="image/gif", body=_GIF_1PX)
+            else:
+                await route.abort("blockedbyclient")
+
+        await context.route("**/*", handle)
+        return stats
@@ -1,19 +1,26 @@
 # server.py
 
-import io
-import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import StreamingResponse
-from playwright.async_api import async_playwright, TimeoutError as PWTimeoutError
+from fastapi.responses import FileResponse
+
+from circuit_breaker import CircuitOpen
+from mavat_scraper import PlanUnavailable, cached_plan_pdf, metrics, pool
+
 
-app = FastAPI(title="Mavat Plan-PDF MCP Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm browsers up front; every request gets its own context from the pool
+    await pool.start()
+    try:
+        yield
+    finally:
+        await pool.stop()
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    # no-op to keep FastAPI happy
-    await asyncio.sleep(0)
+app = FastAPI(title="Mavat Plan-PDF MCP Service", lifespan=lifespan)
 
-@app.get("/plan-pdf/", response_class=StreamingResponse)
+@app.get("/plan-pdf/", response_class=FileResponse)
 async def get_plan_pdf(
     plan_number: str = Query(..., description="The numeric plan identifier")
 ):
@@ -21,55 +28,25 @@ async def get_plan_pdf(
     Downloads the raw PDF for the given plan number and streams it back as
     application/pdf so the calling agent can save or re-process the file.
     """
-    async with async_playwright() as p:
-        # 1) Launch headless Chromium
-        browser = await p.chromium.launch(headless=True)
-        # 2) Enable downloads in this context
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
-
-        target = f"https://mavat.iplan.gov.il/SV3?text={plan_number}"
-        # 3) Navigate (with a timeout guard)
-        try:
-            await page.goto(target, wait_until="load", timeout=30_000)
-        except PWTimeoutError:
-            # if it times out, we’ll proceed anyway
-            pass
-
-        # 4) Wait a bit for any JS-led redirect/render
-        await page.wait_for_timeout(1_000)
-
-        # 5) Handle the possible redirect back to SV3
-        if page.url != target:
-            await page.go_back(wait_until="load", timeout=10_000)
-            await page.wait_for_timeout(500)
-
-        # 6) Open the relevant accordions
-        await page.click("div.uk-accordion-title:has-text('מסמכי התכנית')", timeout=10_000)
-        await page.wait_for_timeout(300)
-        await page.click("div.uk-accordion-title.title-b:has-text('מסמכים בתהליך')", timeout=10_000)
-        await page.wait_for_timeout(300)
-        await page.click("span.uk-text-lead:has-text('הוראות')", timeout=10_000)
-        await page.wait_for_timeout(300)
-
-        # 7) Trigger the download of the PDF file
-        async with page.expect_download(timeout=20_000) as download_info:
-            await page.click('img.sv4-icon-file.pdf-download[title="ראה קובץ בפורמט PDF"]')
-        download = await download_info.value
-
-        # 8) Read the downloaded file from disk
-        path = await download.path()
-        if not path:
-            raise HTTPException(500, "Download failed: no file saved")
-        pdf_bytes = open(path, "rb").read()
-
-        # 9) Clean up
-        await context.close()
-        await browser.close()
-
-    # 10) Stream raw PDF bytes back to caller
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
+    try:
+        pdf_path = await cached_plan_pdf(plan_number)
+    except CircuitOpen as exc:
+        # MaVaT is down and we hold no copy: fail fast, tell clients when to retry
+        raise HTTPException(503, str(exc),
+                            headers={"Retry-After": str(int(exc.retry_after))})
+    except PlanUnavailable as exc:
+        raise HTTPException(404, str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(500, str(exc))
+
+    # Stream the cached PDF file back to the caller
+    return FileResponse(
+        pdf_path,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{plan_number}.pdf"'},
+        filename=f"{plan_number}.pdf",
     )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Circuit-breaker state, MaVaT step latencies, browser pool and PDF cache."""
+    return metrics()
@@ -1,35 +1,46 @@
-import io, anyio
+import io
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from playwright.sync_api import sync_playwright
-
-app = FastAPI(title="Mavat Plan-PDF MCP Service")
-
-def fetch_pdf(plan_number: str) -> bytes:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page    = browser.new_page()
-
-        pdf: bytes | None = None
-        def catcher(resp):
-            nonlocal pdf
-            if "application/pdf" in resp.headers.get("content-type", ""):
-                pdf = resp.body()
-
-        page.on("response", catcher)
-        page.goto(f"https://mavat.iplan.gov.il/SV3?text={plan_number}",
-                  wait_until="networkidle")
-        page.click('button[title="הצג PDF"]')
-        page.wait_for_timeout(3000)
-        browser.close()
-        if pdf is None:
+from playwright.async_api import TimeoutError as PWTimeoutError
+
+from mavat_scraper import MAVAT_URL, pool, route_policy
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pool.start()
+    try:
+        yield
+    finally:
+        await pool.stop()
+
+app = FastAPI(title="Mavat Plan-PDF MCP Service", lifespan=lifespan)
+
+async def fetch_pdf(plan_number: str) -> bytes:
+    async with pool.context() as context:
+        await route_policy.install(context)       # skip images / fonts / trackers
+        page = await context.new_page()
+
+        # no networkidle / fixed sleep: the click auto-waits for the button,
+        # and we return as soon as the PDF response itself arrives
+        await page.goto(MAVAT_URL.format(plan_number=plan_number), wait_until="commit")
+        try:
+            async with page.expect_response(
+                lambda r: "application/pdf" in r.headers.get("content-type", ""),
+                timeout=30_000,
+            ) as resp_info:
+                await page.click('button[title="הצג PDF"]', timeout=30_000)
+            resp = await resp_info.value
+        except PWTimeoutError:
             raise RuntimeError("PDF not found")
-        return pdf
+        return await resp.body()
 
 @app.get("/plan-pdf/", response_class=StreamingResponse)
 async def get_plan_pdf(plan_number: str = Query(...)):
     try:
-        pdf_bytes = await anyio.to_thread.run_sync(fetch_pdf, plan_number)
+        pdf_bytes = await fetch_pdf(plan_number)
     except Exception as exc:
         raise HTTPException(500, str(exc))
 
@@ -0,0 +1,145 @@
+"""
+singleflight.py
+---------------
+Coalesce concurrent calls for the same key into one execution.
+
+    flights = SingleFlight("mavat")
+    path = await flights.run(plan_number, lambda: fetch(plan_number))   # asyncio
+    data = flights.run_sync(plan_number, lambda: extract(plan_number))  # threads
+
+• In-process: the first caller for a key becomes the leader; everybody who
+  arrives while it is running awaits the leader's result (or exception)
+  instead of starting their own.
+• Cross-worker: the leader holds an exclusive file lock
+  (CACHE_DIR/locks/<name>-<hash>.lock), so leaders in other processes wait
+  for it and then run `fn` themselves — which is cheap when `fn` consults a
+  shared cache first (pdf_cache, kvcache), as every caller here does.
+  Without fcntl (Windows) only the in-process layer applies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, TypeVar
+
+from kvcache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:                     # Windows – in-process coalescing only
+    fcntl = None
+
+T = TypeVar("T")
+
+LOCK_POLL_S = 0.1
+
+
+class SingleFlight:
+    """Per-key single-flight for coroutines and for plain threaded calls."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._async: dict[str, asyncio.Task] = {}
+        self._sync: dict[str, "_Call"] = {}
+        self._mu = threading.Lock()
+        self.coalesced = 0
+
+    def _lock_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        folder = CACHE_DIR / "locks"
+        folder.mkdir(parents=True, exist_ok=True)
+        return str(folder / f"{self.name}-{digest}.lock")
+
+    # ── cross-process lock ───────────────────────────────────────────────────
+    @contextmanager
+    def _file_lock(self, key: str):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)                # closing releases the lock
+
+    @asynccontextmanager
+    async def _file_lock_async(self, key: str):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:                 # poll so the event loop keeps running
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_POLL_S)
+            yield
+        finally:
+            os.close(fd)
+
+    # ── asyncio ──────────────────────────────────────────────────────────────
+    async def run(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()` once per key at a time; concurrent callers share its result."""
+        task = self._async.get(key)
+        if task is None:
+            # a task of its own, so a cancelled caller doesn't cancel the others
+            task = asyncio.ensure_future(self._lead(key, fn))
+            self._async[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        async with self._file_lock_async(key):
+            return await fn()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._async.pop(key, None)
+        if not task.cancelled():
+            task.exception()            # retrieved, even if every caller gave up
+
+    # ── threads ──────────────────────────────────────────────────────────────
+    def run_sync(self, key: str, fn: Callable[[], T]) -> T:
+        """Blocking counterpart of `run` for code called from worker threads."""
+        with self._mu:
+            call = self._sync.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.wait()
+
+        try:
+            with self._file_lock(key):
+                call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._mu:
+                del self._sync[key]
+            call.done.set()
+        return call.result
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
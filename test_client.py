@@ -9,6 +9,7 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import json
 import sys
 import warnings
 from pathlib import Path
@@ -32,19 +33,23 @@ async def main(plan_number: str) -> None:
         async with ClientSession(read_stream, write_stream) as session:
             await session.initialize()
 
-            # 5) Call the tool
+            # 5) Call the tool – it answers with an artifact handle
             result = await session.call_tool(
                 "get_plan_pdf", {"plan_number": plan_number}
             )
+            handle = json.loads(result.content[0].text)
+
+            # 6) Stream the PDF chunks from the blob resource into a file
+            out_path = Path(f"{plan_number}.pdf").resolve()
+            with open(out_path, "wb") as f:
+                for chunk in range(handle["chunks"]):
+                    res = await session.read_resource(f"{handle['uri']}/{chunk}")
+                    f.write(base64.b64decode(res.contents[0].blob))
 
         # ⬆️ Leaving ClientSession closes the JSON-RPC channel politely.
     # ⬆️ Leaving stdio_client waits for the child process to exit.
 
-    # 6) Decode and save the returned PDF
-    pdf_bytes = base64.b64decode(result.content[0].text)
-    out_path = Path(f"{plan_number}.pdf").resolve()
-    out_path.write_bytes(pdf_bytes)
-    print(f"✅  Saved {out_path}")
+    print(f"✅  Saved {out_path} ({handle['size']:,} bytes, sha256 {handle['sha256'][:12]}…)")
 
 
 if __name__ == "__main__":